@@ -0,0 +1,345 @@
+"""AI分析服务 - 后台线程调用模型，结果按 (角色, 得分, 语言) 缓存
+
+结果页不等待网络：最后一题提交时就发出请求（request() 立即返回 Analysis），
+页面每隔一小段时间读取已收到的文字，逐步显示。相同的档案在缓存有效期内不会再调用模型，
+同时进行的相同请求合并为一次；后端并发数、排队长度有上限，后端连续失败时断路，
+排不上队或断路时直接显示固定文字（队列深度、排队时间见 kpop_metrics）。
+
+    KPOP_AI_BACKEND=fake KPOP_AI_FAKE_LATENCY=3 streamlit run kpop_app_fixed.py   # 离线测试
+    python -m kpop_analysis bench --requests 500 --profiles 50                     # 突发流量下的表现
+
+后端选择（KPOP_AI_BACKEND）：openai（配置了 OPENAI_API_KEY 时默认）、fake（本地模拟）、off。
+不导入 Streamlit。
+"""
+import argparse
+import collections
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import kpop_metrics
+
+BACKEND = os.environ.get("KPOP_AI_BACKEND", "")
+OPENAI_MODEL = os.environ.get("KPOP_OPENAI_MODEL", "gpt-4o-mini")
+FAKE_LATENCY = float(os.environ.get("KPOP_AI_FAKE_LATENCY", "2.0"))  # 秒，从请求到完整回答
+FAKE_FAILURE_RATE = float(os.environ.get("KPOP_AI_FAKE_FAILURE_RATE", "0"))
+CACHE_TTL = float(os.environ.get("KPOP_AI_CACHE_TTL", "3600"))  # 秒
+CACHE_SIZE = int(os.environ.get("KPOP_AI_CACHE_SIZE", "1024"))
+WORKERS = int(os.environ.get("KPOP_AI_WORKERS", "8"))  # 同时调用后端的上限
+MAX_QUEUE = int(os.environ.get("KPOP_AI_MAX_QUEUE", "64"))  # 等待空闲 worker 的上限，超出时返回固定文字
+TIMEOUT = float(os.environ.get("KPOP_AI_TIMEOUT", "20"))  # 秒，单次后端调用
+BREAKER_FAILURES = int(os.environ.get("KPOP_AI_BREAKER_FAILURES", "5"))
+BREAKER_COOLDOWN = float(os.environ.get("KPOP_AI_BREAKER_COOLDOWN", "30"))  # 秒
+
+
+def analysis_key(role, scores, locale):
+    """缓存键：(结果角色, 得分元组, 语言)"""
+    return (role, tuple(int(score) for score in scores), locale)
+
+
+class Analysis:
+    """一次分析请求的结果；后台线程逐段追加文字，页面随时读取"""
+
+    __slots__ = ("_chunks", "_done", "error", "finished_at")
+
+    def __init__(self):
+        self._chunks = []
+        self._done = threading.Event()
+        self.error = None
+        self.finished_at = None  # 完成时的 time.perf_counter()，用来统计延迟
+
+    @classmethod
+    def completed(cls, text):
+        analysis = cls()
+        analysis.append(text)
+        analysis.finish()
+        return analysis
+
+    @property
+    def text(self):
+        """到目前为止收到的文字"""
+        return "".join(self._chunks)
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """等待完成（离线工具用；页面不要调用）"""
+        return self._done.wait(timeout)
+
+    def append(self, chunk):
+        self._chunks.append(chunk)
+
+    def finish(self):
+        self.finished_at = time.perf_counter()
+        self._done.set()
+
+    def fail(self, error):
+        self.error = error
+        self.finished_at = time.perf_counter()
+        self._done.set()
+
+
+class OpenAIBackend:
+    """OpenAI Chat Completions，流式返回"""
+
+    def __init__(self, api_key, model=OPENAI_MODEL):
+        self.api_key = api_key
+        self.model = model
+        self._client = None
+
+    def stream(self, prompt):
+        if self._client is None:
+            # openai 体积大，第一次真正请求时才导入
+            import openai
+            self._client = openai.OpenAI(api_key=self.api_key)
+        response = self._client.chat.completions.create(
+            model=self.model,
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=300,
+            temperature=0.7,
+            stream=True,
+            timeout=TIMEOUT,
+        )
+        for chunk in response:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+
+class FakeBackend:
+    """本地模拟后端：总共耗时 latency 秒，分 chunks 段返回提示词的摘要；按 failure_rate 的概率失败"""
+
+    def __init__(self, latency=FAKE_LATENCY, chunks=8, failure_rate=FAKE_FAILURE_RATE, seed=None):
+        self.latency = latency
+        self.chunks = chunks
+        self.failure_rate = failure_rate
+        self.calls = 0
+        self._rng = random.Random(seed)
+
+    def stream(self, prompt):
+        self.calls += 1
+        if self._rng.random() < self.failure_rate:
+            time.sleep(self.latency)
+            raise TimeoutError("fake backend timed out")
+        text = f"[fake analysis] {' '.join(prompt.split())}"
+        step = -(-len(text) // self.chunks)
+        for start in range(0, len(text), step):
+            time.sleep(self.latency / self.chunks)
+            yield text[start:start + step]
+
+
+def backend_from_env():
+    """按 KPOP_AI_BACKEND / OPENAI_API_KEY 选择后端；没有可用后端时返回 None（页面显示固定文字）"""
+    api_key = os.environ.get("OPENAI_API_KEY")
+    if BACKEND == "fake":
+        return FakeBackend()
+    if BACKEND == "openai" or (BACKEND == "" and api_key):
+        return OpenAIBackend(api_key) if api_key else None
+    return None
+
+
+class TTLCache:
+    """线程安全的 LRU 缓存：超过 ttl 秒的条目失效，超过 max_entries 时淘汰最久未用的"""
+
+    def __init__(self, max_entries=CACHE_SIZE, ttl=CACHE_TTL, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = collections.OrderedDict()  # key -> (过期时间, 值)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > self._clock():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (self._clock() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class CircuitBreaker:
+    """连续失败 threshold 次后断开 cooldown 秒；之后放行一次试探请求，成功则恢复，失败则再次断开"""
+
+    def __init__(self, threshold=BREAKER_FAILURES, cooldown=BREAKER_COOLDOWN, clock=time.monotonic):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._clock = clock
+        self._failures = 0
+        self._open_until = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self._open_until is not None
+
+    def allow(self):
+        """是否可以调用后端"""
+        with self._lock:
+            if self._open_until is None:
+                return True
+            if self._probing or self._clock() < self._open_until:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._open_until = None
+            self._probing = False
+        kpop_metrics.observe_ai_breaker(False)
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self._failures < self.threshold and self._open_until is None:
+                return
+            self._open_until = self._clock() + self.cooldown
+        kpop_metrics.observe_ai_breaker(True)
+
+
+class AnalysisService:
+    """所有会话共用的分发器；request() 不阻塞
+
+    - 命中缓存：直接返回
+    - 相同档案的请求正在进行：共用同一个 Analysis，不重复调用后端
+    - 同时调用后端的数量不超过 workers，排队的超过 max_queue 时直接返回固定文字
+    - 后端连续失败时断路，冷却期间直接返回固定文字
+    """
+
+    def __init__(self, backend, cache=None, workers=WORKERS, max_queue=MAX_QUEUE, breaker=None):
+        self.backend = backend
+        self.cache = cache or TTLCache()
+        self.breaker = breaker or CircuitBreaker()
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="kpop-analysis")
+        self._inflight = {}  # key -> Analysis（排队中或执行中）
+        self._queued = 0
+        self._running = 0
+        self._lock = threading.Lock()
+        kpop_metrics.observe_ai_breaker(False)
+
+    @classmethod
+    def from_env(cls):
+        return cls(backend_from_env())
+
+    def request(self, key, prompt, fallback):
+        """提交分析请求，返回 Analysis；需要调用后端时在后台线程里执行"""
+        if self.backend is None:
+            kpop_metrics.observe_ai_request("disabled")
+            return Analysis.completed(fallback)
+        cached = self.cache.get(key)
+        if cached is not None:
+            kpop_metrics.observe_ai_request("cache")
+            return Analysis.completed(cached)
+
+        with self._lock:
+            analysis = self._inflight.get(key)
+            if analysis is not None:
+                outcome = "coalesced"
+            elif self._queued >= self.max_queue:
+                outcome = "shed"
+            elif not self.breaker.allow():
+                outcome = "breaker_open"
+            else:
+                outcome = "backend"
+                analysis = self._inflight[key] = Analysis()
+                self._queued += 1
+                queued, running = self._queued, self._running
+        kpop_metrics.observe_ai_request(outcome)
+        if outcome in ("shed", "breaker_open"):
+            return Analysis.completed(fallback)
+        if outcome == "backend":
+            kpop_metrics.observe_ai_queue(queued, running)
+            self._executor.submit(self._run, key, prompt, analysis, time.monotonic())
+        return analysis
+
+    def _run(self, key, prompt, analysis, submitted):
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+            queued, running = self._queued, self._running
+        kpop_metrics.observe_ai_queue(queued, running, time.monotonic() - submitted)
+        try:
+            for chunk in self.backend.stream(prompt):
+                analysis.append(chunk)
+        except Exception as e:
+            # 失败的结果不缓存，下一个相同档案会重新请求
+            self.breaker.record_failure()
+            analysis.fail(e)
+        else:
+            self.breaker.record_success()
+            self.cache.put(key, analysis.text)
+            analysis.finish()
+        finally:
+            with self._lock:
+                del self._inflight[key]
+                self._running -= 1
+                queued, running = self._queued, self._running
+            kpop_metrics.observe_ai_queue(queued, running)
+
+
+def main(argv=None):
+    """命令行入口"""
+    parser = argparse.ArgumentParser(prog="python -m kpop_analysis", description="AI分析服务工具")
+    commands = parser.add_subparsers(dest="command", required=True)
+    bench = commands.add_parser("bench", help="用本地模拟后端模拟一波突发请求")
+    bench.add_argument("--requests", type=int, default=500, help="请求数")
+    bench.add_argument("--profiles", type=int, default=50, help="不同档案（缓存键）的数量")
+    bench.add_argument("--latency", type=float, default=FAKE_LATENCY, help="模拟后端的延迟（秒）")
+    bench.add_argument("--failure-rate", type=float, default=0.0, help="模拟后端的失败概率")
+    bench.add_argument("--interval", type=float, default=0.01, help="请求间隔（秒）")
+    bench.add_argument("--workers", type=int, default=WORKERS)
+    bench.add_argument("--max-queue", type=int, default=MAX_QUEUE)
+    bench.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    if args.command == "bench":
+        rng = random.Random(args.seed)
+        backend = FakeBackend(args.latency, failure_rate=args.failure_rate, seed=args.seed)
+        service = AnalysisService(backend, workers=args.workers, max_queue=args.max_queue)
+        pending = []
+        started = time.perf_counter()
+        for _ in range(args.requests):
+            profile = rng.randrange(args.profiles)
+            key = analysis_key("producer", (profile,), "ja")
+            pending.append((time.perf_counter(), service.request(key, f"profile {profile}", fallback="")))
+            time.sleep(args.interval)
+
+        # 每个请求从提交到完成的时间；完成时间由 Analysis 自己记下，与什么时候来检查无关
+        # （共用同一个请求的按各自的提交时间算，命中缓存的约为 0）
+        for _, analysis in pending:
+            analysis.wait()
+        latencies = sorted(max(analysis.finished_at - submitted, 0.0) for submitted, analysis in pending)
+
+        print(f"requests:       {args.requests} over {args.profiles} profiles in {time.perf_counter() - started:.1f}s")
+        print(f"backend calls:  {backend.calls}")
+        for p in (50, 95, 99):
+            print(f"answer p{p}:     {latencies[min(len(latencies) - 1, len(latencies) * p // 100)] * 1000:8.1f} ms")
+        for line in kpop_metrics.render().splitlines():
+            if line.startswith("kpop_ai_") and "_bucket" not in line:
+                print(line)
+
+if __name__ == "__main__":
+    main()
@@ -1,697 +1,136 @@
+import time
+_script_start = time.perf_counter()
+
 import os, streamlit as st
-import plotly.graph_objects as go
-import pandas as pd
-import openai
+# 不导入 pandas（从未使用，冷启动约省 0.6 秒）；openai 只在真正请求时导入（见 kpop_analysis）。
+# plotly 也写成用到时才导入，但 Streamlit 1.65 的 `import streamlit` 已经加载了 plotly.graph_objects，
+# 在这个版本上推迟导入并不省时间（冷启动 784 ms vs 770 ms，在误差范围内）
 from typing import Dict, List
 import json
+import html
+from contextlib import contextmanager
+
+import kpop_analysis
+import kpop_assets
+import kpop_content
+import kpop_metrics
+import kpop_profiling
+import kpop_results
+import kpop_scoring
+import kpop_session
+import kpop_stats
+
+# 每次重跑都会执行到这里，但只有进程里的第一次真正导入模块
+kpop_profiling.record_once("module import", time.perf_counter() - _script_start)
+kpop_metrics.start_exporter()
+kpop_content.start_watcher()
+kpop_results.start_writer()
+kpop_stats.start_rebuild()
 
 # 页面配置
-st.set_page_config(
-    page_title="K-pop創作適性診断",
-    page_icon="🎵",
-    layout="wide",
-    initial_sidebar_state="collapsed"
-)
-
-# 自定义CSS样式 - 引用外部文件
+with kpop_profiling.timed("st.set_page_config"):
+    st.set_page_config(
+        page_title="K-pop創作適性診断",
+        page_icon="🎵",
+        layout="wide",
+        initial_sidebar_state="collapsed"
+    )
+
+# 自定义CSS样式 - 引用外部文件（每个进程只读取/压缩一次，见 kpop_assets）
+@kpop_profiling.profiled()
 def load_css():
-    css_path = os.path.join(os.path.dirname(__file__), "aespa_cyber_css.css")
-    with open(css_path, "r", encoding="utf-8") as f:
-        st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
-    
-    # 添加简化的radio样式
-    st.markdown("""
-    <style>
-    /* 简化的radio选项样式 */
-    .stRadio > div {
-        gap: 18px !important;
-    }
-    
-    .stRadio > div > label {
-        background: linear-gradient(135deg, 
-            rgba(255, 255, 255, 0.06) 0%, 
-            rgba(255, 182, 217, 0.03) 50%,
-            rgba(255, 255, 255, 0.04) 100%) !important;
-        backdrop-filter: blur(15px) !important;
-        border: 1.5px solid rgba(255, 255, 255, 0.15) !important;
-        border-radius: 20px !important;
-        padding: 25px !important;
-        margin-bottom: 18px !important;
-        transition: all 0.4s cubic-bezier(0.4, 0, 0.2, 1) !important;
-        cursor: pointer !important;
-        position: relative !important;
-        display: flex !important;
-        align-items: flex-start !important;
-        gap: 15px !important;
-        color: #ffffff !important;
-        font-family: 'M PLUS Rounded 1c', sans-serif !important;
-    }
-    
-    .stRadio > div > label:hover {
-        border: 2px solid rgba(0, 212, 255, 0.6) !important;
-        background: linear-gradient(135deg, 
-            rgba(0, 212, 255, 0.08) 0%, 
-            rgba(168, 230, 207, 0.05) 50%,
-            rgba(255, 182, 217, 0.06) 100%) !important;
-        transform: translateY(-5px) scale(1.02) !important;
-        box-shadow: 0 15px 40px rgba(0, 212, 255, 0.2) !important;
-    }
-    
-    .stRadio > div > label > div:last-child {
-        color: #ffffff !important;
-        font-family: 'M PLUS Rounded 1c', sans-serif !important;
-        font-weight: 500 !important;
-        line-height: 1.5 !important;
-        font-size: 1.1rem !important;
-    }
-    
-    /* 选中状态 */
-    .stRadio > div > label:has(input[checked]) {
-        border: 2px solid rgba(255, 182, 217, 0.8) !important;
-        background: linear-gradient(135deg, 
-            rgba(255, 182, 217, 0.12) 0%, 
-            rgba(0, 212, 255, 0.06) 50%,
-            rgba(168, 230, 207, 0.08) 100%) !important;
-        box-shadow: 0 20px 50px rgba(255, 182, 217, 0.25) !important;
-        transform: translateY(-5px) scale(1.02) !important;
-    }
-    
-    /* Radio按钮样式 */
-    .stRadio input[type="radio"] {
-        width: 20px !important;
-        height: 20px !important;
-        border: 2px solid rgba(255, 255, 255, 0.3) !important;
-        border-radius: 50% !important;
-        background: transparent !important;
-        appearance: none !important;
-        flex-shrink: 0 !important;
-        margin: 3px 0 0 0 !important;
-    }
-    
-    .stRadio input[type="radio"]:checked {
-        border-color: rgba(255, 182, 217, 0.8) !important;
-        background: radial-gradient(circle, #FFB6D9 30%, transparent 30%) !important;
-        box-shadow: 0 0 15px rgba(255, 182, 217, 0.6) !important;
-    }
-    </style>
-    """, unsafe_allow_html=True)
-    
-# 问题数据
-QUESTIONS = [
-    {
-        "text": "普段よく飲むコーヒーは？",
-        "options": [
-            {
-                "text": "ブラック一択",
-                "desc": "余計なものはいらない派",
-                "weights": {"concept": 2, "producer": 2, "lyric": 0, "visual": 0, "performance": 0, "fan": 0},
-                "tags": ["Analytical", "Creative"]
-            },
-            {
-                "text": "ラテとかミルク系",
-                "desc": "バランス重視で安心する",
-                "weights": {"concept": 0, "producer": 1, "lyric": 0, "visual": 2, "performance": 0, "fan": 1},
-                "tags": ["Coordinative", "Analytical"]
-            },
-            {
-                "text": "その日の気分で毎回違うやつ",
-                "desc": "飽きるのが嫌",
-                "weights": {"concept": 0, "producer": 0, "lyric": 2, "visual": 0, "performance": 2, "fan": 0},
-                "tags": ["Creative", "Performing"]
-            },
-            {
-                "text": "いつも同じお気に入りの一杯",
-                "desc": "これが一番落ち着く",
-                "weights": {"concept": 0, "producer": 2, "lyric": 0, "visual": 0, "performance": 0, "fan": 2},
-                "tags": ["Analytical", "Coordinative"]
-            },
-            {
-                "text": "実はコーヒーよりお茶派",
-                "desc": "みんなと違うけどこれが好き",
-                "weights": {"concept": 2, "producer": 0, "lyric": 1, "visual": 0, "performance": 0, "fan": 0},
-                "tags": ["Creative", "Analytical"]
-            }
-        ]
-    },
-    {
-        "text": "朝起きてすぐ聞きたい音楽は？",
-        "options": [
-            {
-                "text": "静かなアコースティック系",
-                "desc": "ゆっくり目覚めたい",
-                "weights": {"concept": 2, "producer": 0, "lyric": 2, "visual": 0, "performance": 0, "fan": 0},
-                "tags": ["Creative", "Coordinative"]
-            },
-            {
-                "text": "アップテンポなやつ",
-                "desc": "テンション上げて一日をスタート",
-                "weights": {"concept": 0, "producer": 0, "lyric": 0, "visual": 0, "performance": 3, "fan": 1},
-                "tags": ["Performing", "Coordinative"]
-            },
-            {
-                "text": "心に響く歌詞のバラード",
-                "desc": "感情を整理したい",
-                "weights": {"concept": 1, "producer": 0, "lyric": 3, "visual": 0, "performance": 0, "fan": 0},
-                "tags": ["Creative", "Coordinative"]
-            },
-            {
-                "text": "電子音楽とかクールなサウンド",
-                "desc": "なんかかっこいい気分になりたい",
-                "weights": {"concept": 0, "producer": 3, "lyric": 0, "visual": 1, "performance": 0, "fan": 0},
-                "tags": ["Analytical", "Creative"]
-            },
-            {
-                "text": "その時のバイブスで決める",
-                "desc": "気分に任せる派",
-                "weights": {"concept": 0, "producer": 0, "lyric": 1, "visual": 0, "performance": 2, "fan": 0},
-                "tags": ["Performing", "Creative"]
-            }
-        ]
-    },
-    {
-        "text": "スマホの待ち受け画面は？",
-        "options": [
-            {
-                "text": "シンプルな単色とか抽象的なやつ",
-                "desc": "ごちゃごちゃしてるの苦手",
-                "weights": {"concept": 2, "producer": 1, "lyric": 0, "visual": 0, "performance": 0, "fan": 0},
-                "tags": ["Analytical", "Creative"]
-            },
-            {
-                "text": "推しの写真",
-                "desc": "毎日見て元気もらってる",
-                "weights": {"concept": 0, "producer": 0, "lyric": 0, "visual": 0, "performance": 1, "fan": 3},
-                "tags": ["Coordinative", "Performing"]
-            },
-            {
-                "text": "風景とか自然の写真",
-                "desc": "癒やされたい",
-                "weights": {"concept": 1, "producer": 0, "lyric": 0, "visual": 3, "performance": 0, "fan": 0},
-                "tags": ["Creative", "Coordinative"]
-            },
-            {
-                "text": "家族とか友達の写真",
-                "desc": "大切な人を忘れたくない",
-                "weights": {"concept": 0, "producer": 0, "lyric": 2, "visual": 0, "performance": 0, "fan": 2},
-                "tags": ["Coordinative", "Creative"]
-            },
-            {
-                "text": "特にこだわりなし、デフォルトのまま",
-                "desc": "面倒くさい",
-                "weights": {"concept": 0, "producer": 2, "lyric": 0, "visual": 0, "performance": 0, "fan": 1},
-                "tags": ["Analytical"]
-            }
-        ]
-    },
-    {
-        "text": "無人島に一つだけ持っていけるとしたら？",
-        "options": [
-            {
-                "text": "哲学書とか、深く考えられる本",
-                "desc": "ひとりの時間を大切にしたい",
-                "weights": {"concept": 3, "producer": 0, "lyric": 1, "visual": 0, "performance": 0, "fan": 0},
-                "tags": ["Creative", "Analytical"]
-            },
-            {
-                "text": "ナイフとかサバイバルグッズ",
-                "desc": "とりあえず生き延びることを考える",
-                "weights": {"concept": 0, "producer": 3, "lyric": 0, "visual": 0, "performance": 1, "fan": 0},
-                "tags": ["Analytical", "Performing"]
-            },
-            {
-                "text": "日記帳とペン",
-                "desc": "自分の気持ちを書き留めておきたい",
-                "weights": {"concept": 1, "producer": 0, "lyric": 3, "visual": 0, "performance": 0, "fan": 0},
-                "tags": ["Creative", "Coordinative"]
-            },
-            {
-                "text": "楽器か音が出るもの",
-                "desc": "音楽がないと生きていけない",
-                "weights": {"concept": 0, "producer": 1, "lyric": 0, "visual": 0, "performance": 3, "fan": 0},
-                "tags": ["Performing", "Creative"]
-            },
-            {
-                "text": "スマホ",
-                "desc": "圏外でも写真とか撮りたい...",
-                "weights": {"concept": 0, "producer": 0, "lyric": 0, "visual": 2, "performance": 0, "fan": 2},
-                "tags": ["Coordinative", "Creative"]
-            }
-        ]
-    },
-    {
-        "text": "タイムスリップできるなら、どの時代に行きたい？",
-        "options": [
-            {
-                "text": "古代ギリシャとか、哲学が生まれた時代",
-                "desc": "人類の知恵の原点を見てみたい",
-                "weights": {"concept": 3, "producer": 0, "lyric": 1, "visual": 0, "performance": 0, "fan": 0},
-                "tags": ["Creative", "Analytical"]
-            },
-            {
-                "text": "産業革命とか、技術革新の現場",
-                "desc": "歴史が動く瞬間に立ち会いたい",
-                "weights": {"concept": 1, "producer": 3, "lyric": 0, "visual": 0, "performance": 0, "fan": 0},
-                "tags": ["Analytical", "Creative"]
-            },
-            {
-                "text": "平安時代とか、美しい文化が花開いた時代",
-                "desc": "美意識の極致を体験したい",
-                "weights": {"concept": 1, "producer": 0, "lyric": 0, "visual": 3, "performance": 0, "fan": 0},
-                "tags": ["Creative", "Coordinative"]
-            },
-            {
-                "text": "60年代とか、音楽文化が爆発した時代",
-                "desc": "伝説のライブを生で見たい",
-                "weights": {"concept": 0, "producer": 0, "lyric": 0, "visual": 0, "performance": 3, "fan": 1},
-                "tags": ["Performing", "Coordinative"]
-            },
-            {
-                "text": "未来",
-                "desc": "今よりもっと進化した世界を見てみたい",
-                "weights": {"concept": 0, "producer": 1, "lyric": 0, "visual": 1, "performance": 0, "fan": 2},
-                "tags": ["Analytical", "Creative"]
-            }
-        ]
-    },
-    {
-        "text": "ペットが急にK-pop歌い出したら？",
-        "options": [
-            {
-                "text": "え、これやばくない？どういう現象？",
-                "desc": "まず状況を理解したい",
-                "weights": {"concept": 3, "producer": 1, "lyric": 0, "visual": 0, "performance": 0, "fan": 0},
-                "tags": ["Analytical", "Creative"]
-            },
-            {
-                "text": "とりあえず動画撮ってSNSに上げる",
-                "desc": "みんなに見せたい！",
-                "weights": {"concept": 0, "producer": 0, "lyric": 0, "visual": 1, "performance": 0, "fan": 3},
-                "tags": ["Coordinative", "Performing"]
-            },
-            {
-                "text": "音程とかリズム感をチェックしちゃう",
-                "desc": "気になる性格",
-                "weights": {"concept": 0, "producer": 3, "lyric": 0, "visual": 0, "performance": 0, "fan": 0},
-                "tags": ["Analytical"]
-            },
-            {
-                "text": "なんか感動して泣きそうになる",
-                "desc": "感情が先に来る",
-                "weights": {"concept": 1, "producer": 0, "lyric": 3, "visual": 0, "performance": 0, "fan": 0},
-                "tags": ["Creative", "Coordinative"]
-            },
-            {
-                "text": "ダンスも覚えさせてみたくなる",
-                "desc": "もっと発展させたい",
-                "weights": {"concept": 0, "producer": 0, "lyric": 0, "visual": 1, "performance": 3, "fan": 0},
-                "tags": ["Performing", "Creative"]
-            }
-        ]
-    },
-    {
-        "text": "友達にK-pop曲を推薦するなら？",
-        "options": [
-            {
-                "text": "まずその人の好みを聞いて慎重に選ぶ",
-                "desc": "相手のことを理解してから",
-                "weights": {"concept": 1, "producer": 0, "lyric": 0, "visual": 0, "performance": 0, "fan": 3},
-                "tags": ["Coordinative", "Analytical"]
-            },
-            {
-                "text": "音楽的に完成度高いやつを推す",
-                "desc": "クオリティで勝負",
-                "weights": {"concept": 0, "producer": 3, "lyric": 0, "visual": 0, "performance": 0, "fan": 0},
-                "tags": ["Analytical"]
-            },
-            {
-                "text": "歌詞が刺さりそうなやつを選ぶ",
-                "desc": "感情的に響きそうなもの",
-                "weights": {"concept": 0, "producer": 0, "lyric": 3, "visual": 0, "performance": 0, "fan": 1},
-                "tags": ["Creative", "Coordinative"]
-            },
-            {
-                "text": "とりあえず今バズってるやつ",
-                "desc": "みんなが聞いてるから安心",
-                "weights": {"concept": 0, "producer": 0, "lyric": 0, "visual": 0, "performance": 1, "fan": 3},
-                "tags": ["Coordinative", "Performing"]
-            },
-            {
-                "text": "自分が一番好きなやつを熱弁",
-                "desc": "自分の想いを伝えたい",
-                "weights": {"concept": 2, "producer": 0, "lyric": 2, "visual": 0, "performance": 0, "fan": 0},
-                "tags": ["Creative", "Performing"]
-            }
-        ]
-    },
-    {
-        "text": "おばあちゃんにK-popダンスを教えるとしたら？",
-        "options": [
-            {
-                "text": "まず簡単な手の動きから始める",
-                "desc": "安全第一で段階的に",
-                "weights": {"concept": 0, "producer": 2, "lyric": 0, "visual": 0, "performance": 0, "fan": 2},
-                "tags": ["Analytical", "Coordinative"]
-            },
-            {
-                "text": "おばあちゃんが知ってそうな曲調のやつを選ぶ",
-                "desc": "親しみやすさ重視",
-                "weights": {"concept": 2, "producer": 0, "lyric": 2, "visual": 0, "performance": 0, "fan": 0},
-                "tags": ["Creative", "Coordinative"]
-            },
-            {
-                "text": "一緒に楽しめる雰囲気作りを大切にする",
-                "desc": "コミュニケーション重視",
-                "weights": {"concept": 0, "producer": 0, "lyric": 1, "visual": 0, "performance": 0, "fan": 3},
-                "tags": ["Coordinative", "Performing"]
-            },
-            {
-                "text": "動画見せながら「こんな感じで〜」って説明",
-                "desc": "ビジュアルで分かりやすく",
-                "weights": {"concept": 0, "producer": 1, "lyric": 0, "visual": 3, "performance": 0, "fan": 0},
-                "tags": ["Creative", "Analytical"]
-            },
-            {
-                "text": "とりあえずノリで一緒に体動かす",
-                "desc": "理屈より楽しさ優先",
-                "weights": {"concept": 0, "producer": 0, "lyric": 0, "visual": 0, "performance": 3, "fan": 1},
-                "tags": ["Performing", "Coordinative"]
-            }
-        ]
-    },
-    {
-        "text": "電車で携帯の充電が切れたら？",
-        "options": [
-            {
-                "text": "窓の外をぼーっと眺めて考え事",
-                "desc": "内省モード",
-                "weights": {"concept": 3, "producer": 0, "lyric": 1, "visual": 0, "performance": 0, "fan": 0},
-                "tags": ["Creative", "Analytical"]
-            },
-            {
-                "text": "車内の広告とか人間観察する",
-                "desc": "周りの情報をインプット",
-                "weights": {"concept": 0, "producer": 0, "lyric": 0, "visual": 2, "performance": 0, "fan": 2},
-                "tags": ["Creative", "Coordinative"]
-            },
-            {
-                "text": "目を閉じて音楽のメロディとか思い出す",
-                "desc": "内なる感性と向き合う",
-                "weights": {"concept": 0, "producer": 0, "lyric": 2, "visual": 0, "performance": 2, "fan": 0},
-                "tags": ["Creative", "Performing"]
-            },
-            {
-                "text": "降りた後のプランを頭の中で整理",
-                "desc": "効率的に時間を使う",
-                "weights": {"concept": 1, "producer": 3, "lyric": 0, "visual": 0, "performance": 0, "fan": 0},
-                "tags": ["Analytical"]
-            },
-            {
-                "text": "隣の人に「充電貸してもらえませんか」って声かける",
-                "desc": "積極的に解決",
-                "weights": {"concept": 0, "producer": 0, "lyric": 0, "visual": 0, "performance": 1, "fan": 3},
-                "tags": ["Coordinative", "Performing"]
-            }
-        ]
-    },
-    {
-        "text": "好きなK-pop曲がAI作曲だったと知ったら？",
-        "options": [
-            {
-                "text": "「音楽の本質って何だろう」って考え込む",
-                "desc": "哲学的に気になる",
-                "weights": {"concept": 3, "producer": 0, "lyric": 1, "visual": 0, "performance": 0, "fan": 0},
-                "tags": ["Creative", "Analytical"]
-            },
-            {
-                "text": "クオリティ高いなら別に問題なくない？",
-                "desc": "結果重視",
-                "weights": {"concept": 0, "producer": 3, "lyric": 0, "visual": 0, "performance": 0, "fan": 1},
-                "tags": ["Analytical", "Coordinative"]
-            },
-            {
-                "text": "なんか複雑な気持ちになる",
-                "desc": "感情がモヤモヤする",
-                "weights": {"concept": 1, "producer": 0, "lyric": 3, "visual": 0, "performance": 0, "fan": 0},
-                "tags": ["Creative", "Coordinative"]
-            },
-            {
-                "text": "逆にかっこいいかも、時代だなあ",
-                "desc": "新しい価値観で受け入れる",
-                "weights": {"concept": 0, "producer": 0, "lyric": 0, "visual": 2, "performance": 2, "fan": 0},
-                "tags": ["Creative", "Performing"]
-            },
-            {
-                "text": "みんなの反応が気になる",
-                "desc": "コミュニティの動向をチェック",
-                "weights": {"concept": 0, "producer": 0, "lyric": 0, "visual": 1, "performance": 0, "fan": 3},
-                "tags": ["Coordinative", "Performing"]
-            }
-        ]
-    }
-]
-
-# 角色定義
-ROLES = {
-    "concept": {
-        "title": "🎭 Concept Creator",
-        "subtitle": "世界観の設計者",
-        "description": "あなたは作品全体の方向性とメッセージを描く、創作プロセスの司令塔タイプです。",
-        "strengths": [
-            "複雑なアイデアを整理し、一貫したストーリーに組み立てる能力",
-            "チーム全体に共通のビジョンを伝える統率力",
-            "文化的・社会的文脈を作品に織り込む洞察力"
-        ],
-        "career": [
-            "A&R（Artist & Repertoire）プロデューサー",
-            "クリエイティブディレクター",
-            "プロジェクトプロデューサー",
-            "コンテンツプランナー"
-        ],
-        "next_steps": [
-            "プロジェクト管理のスキルを磨く",
-            "業界トレンドと文化的背景の研究",
-            "多様なクリエイターとのネットワーク構築"
-        ]
-    },
-    "producer": {
-        "title": "🎹 Music Producer",
-        "subtitle": "サウンドの魔術師",
-        "description": "あなたは技術的精度と音楽的革新を両立する、制作の中核を担うタイプです。",
-        "strengths": [
-            "音楽理論と最新技術を融合させる専門性",
-            "細部への集中力と完璧主義的な品質管理",
-            "トレンドを先読みしながら独自性を生み出す能力"
-        ],
-        "career": [
-            "音楽プロデューサー",
-            "作曲家・編曲家",
-            "サウンドエンジニア",
-            "オーディオディレクター"
-        ],
-        "next_steps": [
-            "DAWソフトウェアと音響技術の習得",
-            "音楽理論と作曲技法の深化",
-            "業界プロデューサーとの実習・コラボ経験"
-        ]
-    },
-    "lyric": {
-        "title": "✏️ Lyric Writer",
-        "subtitle": "言葉の詩人",
-        "description": "あなたは感情を言葉に変換し、人の心に直接響く表現を生み出すタイプです。",
-        "strengths": [
-            "複雑な感情を的確な言葉で表現する語彙力",
-            "リズムと意味を両立させる詩的センス",
-            "ターゲット層の心理と感性を理解する共感力"
-        ],
-        "career": [
-            "作詞家",
-            "シンガーソングライター",
-            "コピーライター",
-            "コンテンツライター"
-        ],
-        "next_steps": [
-            "多言語での作詞スキル（韓国語、英語など）",
-            "詩や文学の創作技法を学ぶ",
-            "音楽のリズムと言葉の関係性を研究"
-        ]
-    },
-    "visual": {
-        "title": "🎬 Visual Director",
-        "subtitle": "映像の芸術家",
-        "description": "あなたは音楽を視覚的世界に翻訳し、記憶に残る美的体験を創造するタイプです。",
-        "strengths": [
-            "音楽と映像を融合させる感性",
-            "色彩・構図・演出に対する美的感覚",
-            "技術的制約の中で創造性を発揮する適応力"
-        ],
-        "career": [
-            "ミュージックビデオディレクター",
-            "映像クリエイター",
-            "ビジュアルアートディレクター",
-            "グラフィックデザイナー"
-        ],
-        "next_steps": [
-            "映像制作ソフトウェアの習得",
-            "映画・映像表現の研究",
-            "フォトグラフィーと色彩理論の学習"
-        ]
-    },
-    "performance": {
-        "title": "💃 Performance Designer",
-        "subtitle": "動きの演出家",
-        "description": "あなたは身体表現と空間演出で観客の感情を直接的に動かすタイプです。",
-        "strengths": [
-            "身体の動きで音楽を表現する空間認識力",
-            "観客との一体感を創り出すステージング力",
-            "エネルギーとリズムを視覚化する感性"
-        ],
-        "career": [
-            "コリオグラファー（振付師）",
-            "ステージディレクター",
-            "パフォーマンスコーチ",
-            "イベントプロデューサー"
-        ],
-        "next_steps": [
-            "ダンスと身体表現の技術向上",
-            "ステージ演出と照明の知識習得",
-            "アーティストとの振付コラボ経験"
-        ]
-    },
-    "fan": {
-        "title": "📱 Fan Experience Architect",
-        "subtitle": "絆の設計者",
-        "description": "あなたはアーティストとファンの間に持続的な関係性を築く、戦略的思考を持つタイプです。",
-        "strengths": [
-            "ファン心理とコミュニティ動向を読み取る分析力",
-            "デジタルツールを活用したマーケティング戦略",
-            "長期的な関係性を築くビジネス設計力"
-        ],
-        "career": [
-            "ファンマーケティングマネージャー",
-            "SNSストラテジスト",
-            "デジタルマーケティングプランナー",
-            "コミュニティマネージャー"
-        ],
-        "next_steps": [
-            "デジタルマーケティングツールの習得",
-            "データ分析とファン行動心理の研究",
-            "SNSプラットフォームとコンテンツ戦略の学習"
-        ]
-    }
-}
+    st.markdown(
+        kpop_assets.stylesheet_tag(st.get_option("server.enableStaticServing"), locale=st.session_state.record.locale),
+        unsafe_allow_html=True
+    )
+
+def requested_locale():
+    """会话的初始语言：URL 参数 ?lang=xx 优先，其次环境变量 KPOP_LOCALE，否则用内容包的基础语言"""
+    locales = kpop_content.active_pack().locales
+    for locale in (st.query_params.get("lang"), os.environ.get("KPOP_LOCALE")):
+        if locale in locales:
+            return locale
+    return None
 
+@kpop_profiling.profiled()
 def initialize_session_state():
     """初始化session state"""
   
-    if 'show_welcome' not in st.session_state:
-        st.session_state.show_welcome = True
-   
-    if 'current_question' not in st.session_state:
-        st.session_state.current_question = 0
-    if 'scores' not in st.session_state:
-        st.session_state.scores = {
-            'concept': 0, 'producer': 0, 'lyric': 0, 
-            'visual': 0, 'performance': 0, 'fan': 0
-        }
-    if 'answers' not in st.session_state:
-        st.session_state.answers = []
-    if 'show_result' not in st.session_state:
-        st.session_state.show_result = False
+    if 'record' not in st.session_state:
+        # 每个会话只保存选项序号 + 页面游标 + 内容版本/语言，得分等按需计算（见 kpop_session）
+        st.session_state.record = kpop_session.SessionRecord(locale=requested_locale())
 
+@kpop_profiling.profiled()
 def render_progress_bar():
     """渲染进度条"""
-    progress = (st.session_state.current_question + 1) / len(QUESTIONS)
+    record = st.session_state.record
+    current_question = record.current_question
+    total = record.pack.question_count
+    progress = (current_question + 1) / total
+    progress_text = html.escape(record.text.ui['progress'].format(current=current_question + 1, total=total))
     
     st.markdown(f"""
     <div class="progress-container">
         <div class="progress-bar" style="width: {progress * 100}%"></div>
     </div>
     <div class="progress-text">
-        質問 {st.session_state.current_question + 1}/{len(QUESTIONS)}
+        {progress_text}
     </div>
     """, unsafe_allow_html=True)
 
+@kpop_profiling.profiled()
 def render_question():
     """渲染当前问题 - 修复版本"""
-    question = QUESTIONS[st.session_state.current_question]
+    record = st.session_state.record
+    text = record.text
+    question = text.questions[record.current_question]
     
     # 问题文字直接显示
     st.markdown(f"""
     <div class="main-container">
-    <div class="question-text">{question['text']}</div>
+    <div class="question-text">{html.escape(question['text'])}</div>
     </div>
     """, unsafe_allow_html=True)
     
-    # 创建选项文本，让Streamlit能正常显示
-    option_texts = []
-    for option in question['options']:
-        # 组合主文本和描述文本，格式更清晰
-        combined_text = f"{option['text']} — {option['desc']}"
-        option_texts.append(combined_text)
-    
-    # 使用Streamlit原生radio
+    # 使用Streamlit原生radio：选项值是序号，显示文本取自内容包加载时预先拼好的本语言标签
+    # 默认选中之前记录的选项（返回上一题时能恢复）
+    labels = text.option_labels[record.current_question]
+    chosen = record.chosen(record.current_question)
     selected = st.radio(
-        "選択してください：",
-        option_texts,
-        key=f"question_{st.session_state.current_question}",
+        text.ui['choose'],
+        range(len(labels)),
+        format_func=labels.__getitem__,
+        index=chosen or 0,
+        key=f"question_{record.current_question}",
         label_visibility="collapsed"
     )
     
     return selected
 
-def calculate_scores(selected_option_text, question_idx):
-    """计算得分"""
-    question = QUESTIONS[question_idx]
-    
-    # 找到选择的选项
-    for i, option in enumerate(question['options']):
-        if selected_option_text.startswith(option['text']):
-            # 更新得分
-            for role, weight in option['weights'].items():
-                st.session_state.scores[role] += weight
-            break
+def record_answer(question_idx):
+    """记录某题单选框当前选中的选项序号（覆盖之前的选择，返回上一题再提交不会重复计分）"""
+    st.session_state.record.answer(question_idx, st.session_state[f"question_{question_idx}"])
+
+def calculate_scores():
+    """根据答题记录计算得分向量（按 kpop_scoring.ROLE_KEYS 排列）"""
+    return st.session_state.record.scores
 
 def get_result():
     """获取诊断结果"""
-    max_score = max(st.session_state.scores.values())
-    result_role = [role for role, score in st.session_state.scores.items() if score == max_score][0]
-    return result_role
+    return st.session_state.record.result_role
 
-def render_radar_chart():
-    """生成雷达图 - aespa cyber风格"""
-    categories = ['Concept', 'Producer', 'Lyric', 'Visual', 'Performance', 'Fan']
-    values = [st.session_state.scores[role.lower()] for role in categories]
-    
-    fig = go.Figure()
-    
-    # 主要数据线 - 霓虹粉红色
-    fig.add_trace(go.Scatterpolar(
-        r=values,
-        theta=categories,
-        fill='toself',
-        name='あなたの適性',
-        line=dict(color='#ff006e', width=3),
-        fillcolor='rgba(255, 0, 110, 0.15)',
-        marker=dict(color='#ff006e', size=8, symbol='circle')
-    ))
-    
-    # 添加发光效果 - 青色边框
-    fig.add_trace(go.Scatterpolar(
-        r=values,
-        theta=categories,
-        fill=None,
-        name='',
-        line=dict(color='#00ffff', width=1.5),
-        showlegend=False,
-        marker=dict(color='#00ffff', size=4, symbol='circle')
-    ))
-    
-    fig.update_layout(
+RADAR_CATEGORIES = ('Concept', 'Producer', 'Lyric', 'Visual', 'Performance', 'Fan')
+
+@st.cache_resource(show_spinner=False)
+def _radar_layout(title):
+    """雷达图的静态布局模板 - 每种语言的标题只构建一次，同语言缓存的图共用"""
+    import plotly.graph_objects as go
+
+    return go.Layout(
         polar=dict(
             bgcolor='rgba(0, 0, 0, 0.3)',
             radialaxis=dict(
                 visible=True,
-                range=[0, max(values) + 3],
                 gridcolor='rgba(0, 255, 255, 0.2)',
                 gridwidth=1,
                 linecolor='rgba(0, 255, 255, 0.3)',
@@ -710,7 +149,7 @@ def render_radar_chart():
         ),
         showlegend=False,
         title=dict(
-            text="🎯 あなたの創作適性マップ",
+            text=title,
             x=0.5,
             y=0.95,
             font=dict(
@@ -724,11 +163,8 @@ def render_radar_chart():
         height=500,
         paper_bgcolor='rgba(0, 0, 0, 0)',
         plot_bgcolor='rgba(0, 0, 0, 0)',
-        margin=dict(t=80, b=20, l=20, r=20)
-    )
-    
-    # 添加发光边框效果
-    fig.update_layout(
+        margin=dict(t=80, b=20, l=20, r=20),
+        # 发光边框效果
         shapes=[
             dict(
                 type="circle",
@@ -738,269 +174,368 @@ def render_radar_chart():
             )
         ]
     )
-    
-    return fig
 
-def generate_ai_analysis(result_role, scores):
-    """AI分析生成（需要配置OpenAI API）"""
-    try:
-        # 这里需要配置你的OpenAI API key
-        # openai.api_key = "your-api-key"
-        
-        prompt = f"""
-        ユーザーのK-pop創作適性診断結果を分析してください。
-
-        結果：{ROLES[result_role]['title']}
-        各分野のスコア：{scores}
-
-        以下の形式で、個性的で具体的なアドバイスを200字程度で生成してください：
-        - その人の特徴的な強み
-        - 具体的な行動提案
-        - 業界での成功のヒント
-        """
-        
-        # response = openai.Completion.create(
-        #     engine="text-davinci-003",
-        #     prompt=prompt,
-        #     max_tokens=300,
-        #     temperature=0.7
-        # )
-        # return response.choices[0].text.strip()
-        
-        # APIが設定されていない場合のフォールバック
-        return "🤖 AI分析機能は現在準備中です。OpenAI APIキーを設定すると、個性的な分析を受け取ることができます！"
-        
-    except Exception as e:
-        return f"AI分析でエラーが発生しました: {str(e)}"
+@st.cache_resource(max_entries=256, show_spinner=False)
+def _build_radar_chart(values, title, trace_name):
+    """按得分元组和会话语言的文字构建并缓存雷达图（LRU淘汰）；缓存的图对象只读，不要修改"""
+    import plotly.graph_objects as go
 
-def render_result():
-    """结果页面 - 重新设计布局"""
-    result_role = get_result()
-    role_data = ROLES[result_role]
+    fig = go.Figure(layout=_radar_layout(title))
     
-    # 主标题区域
-    st.markdown(f"""
-    <div style="text-align: center; margin-bottom: 40px;">
-        <div class="result-role">{role_data['title']}</div>
-        <div style="font-family: 'Poppins', sans-serif; font-size: 1.4em; color: #00ffff; 
-                    text-shadow: 0 0 15px #00ffff; margin-bottom: 20px;">
-            {role_data['subtitle']}
-        </div>
-        <div class="result-description">{role_data['description']}</div>
-    </div>
-    """, unsafe_allow_html=True)
-    
-    # 雷达图重点展示区域
-    st.markdown("""
-    <div style="background: linear-gradient(135deg, rgba(255, 255, 255, 0.05) 0%, rgba(255, 255, 255, 0.02) 100%);
-                border: 1px solid rgba(0, 255, 255, 0.3); border-radius: 25px; padding: 30px;
-                margin-bottom: 40px; backdrop-filter: blur(15px);
-                box-shadow: 0 20px 50px rgba(0, 0, 0, 0.2), inset 0 1px 0 rgba(255, 255, 255, 0.1);">
-    """, unsafe_allow_html=True)
-    
-    # 雷达图居中显示
-    col1, col2, col3 = st.columns([1, 2, 1])
-    with col2:
-        fig = render_radar_chart()
-        st.plotly_chart(fig, use_container_width=True)
-    
-    st.markdown("</div>", unsafe_allow_html=True)
-    
-    # 详细信息分区块展示
-    col1, col2 = st.columns(2)
-    
-    with col1:
-        # 强项区块
-        st.markdown("""
-        <div style="background: linear-gradient(135deg, rgba(255, 0, 110, 0.08) 0%, rgba(255, 0, 110, 0.02) 100%);
-                    border: 1px solid rgba(255, 0, 110, 0.3); border-radius: 20px; padding: 25px;
-                    margin-bottom: 20px; backdrop-filter: blur(10px);
-                    box-shadow: 0 15px 35px rgba(255, 0, 110, 0.1);">
-            <h3 style="color: #ff006e; font-family: 'Orbitron', monospace; 
-                       text-shadow: 0 0 15px #ff006e; margin-bottom: 20px;">
-                🎯 あなたの強み
-            </h3>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        for strength in role_data['strengths']:
-            st.markdown(f"""
-            <div style="color: #ffffff; font-family: 'Poppins', sans-serif; 
-                       margin-bottom: 15px; padding-left: 20px; position: relative;
-                       line-height: 1.5;">
-                <span style="position: absolute; left: 0; color: #00ffff; text-shadow: 0 0 5px #00ffff;">▶</span>
-                {strength}
-            </div>
-            """, unsafe_allow_html=True)
+    # 主要数据线 - 霓虹粉红色
+    fig.add_trace(go.Scatterpolar(
+        r=values,
+        theta=RADAR_CATEGORIES,
+        fill='toself',
+        name=trace_name,
+        line=dict(color='#ff006e', width=3),
+        fillcolor='rgba(255, 0, 110, 0.15)',
+        marker=dict(color='#ff006e', size=8, symbol='circle')
+    ))
     
-    with col2:
-        # 推奨キャリア区块
-        st.markdown("""
-        <div style="background: linear-gradient(135deg, rgba(0, 255, 255, 0.08) 0%, rgba(0, 255, 255, 0.02) 100%);
-                    border: 1px solid rgba(0, 255, 255, 0.3); border-radius: 20px; padding: 25px;
-                    margin-bottom: 20px; backdrop-filter: blur(10px);
-                    box-shadow: 0 15px 35px rgba(0, 255, 255, 0.1);">
-            <h3 style="color: #00ffff; font-family: 'Orbitron', monospace; 
-                       text-shadow: 0 0 15px #00ffff; margin-bottom: 20px;">
-                💼 推奨キャリアパス
-            </h3>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        for career in role_data['career']:
-            st.markdown(f"""
-            <div style="color: #ffffff; font-family: 'Poppins', sans-serif; 
-                       margin-bottom: 15px; padding-left: 20px; position: relative;
-                       line-height: 1.5;">
-                <span style="position: absolute; left: 0; color: #ff006e; text-shadow: 0 0 5px #ff006e;">▶</span>
-                {career}
-            </div>
-            """, unsafe_allow_html=True)
+    # 添加发光效果 - 青色边框
+    fig.add_trace(go.Scatterpolar(
+        r=values,
+        theta=RADAR_CATEGORIES,
+        fill=None,
+        name='',
+        line=dict(color='#00ffff', width=1.5),
+        showlegend=False,
+        marker=dict(color='#00ffff', size=4, symbol='circle')
+    ))
     
-    # 次のステップ区块（全宽）
-    st.markdown("""
-    <div style="background: linear-gradient(135deg, rgba(138, 43, 226, 0.08) 0%, rgba(138, 43, 226, 0.02) 100%);
-                border: 1px solid rgba(138, 43, 226, 0.3); border-radius: 20px; padding: 25px;
-                margin: 30px 0; backdrop-filter: blur(10px);
-                box-shadow: 0 15px 35px rgba(138, 43, 226, 0.1);">
-        <h3 style="color: #8a2be2; font-family: 'Orbitron', monospace; 
-                   text-shadow: 0 0 15px #8a2be2; margin-bottom: 20px; text-align: center;">
-            📈 次のステップ
-        </h3>
-    </div>
-    """, unsafe_allow_html=True)
+    fig.update_layout(polar_radialaxis_range=[0, max(values) + 3])
+    return fig
+
+@kpop_profiling.profiled()
+def render_radar_chart():
+    """生成雷达图 - aespa cyber风格（相同得分直接命中缓存）"""
+    scores = kpop_scoring.scores_to_dict(calculate_scores())
+    values = tuple(scores[role.lower()] for role in RADAR_CATEGORIES)
+    ui = st.session_state.record.text.ui
+    return _build_radar_chart(values, ui['radar_title'], ui['radar_trace'])
+
+# 流式显示AI分析时，结果页片段的刷新间隔（秒）
+AI_POLL_INTERVAL = float(os.environ.get("KPOP_AI_POLL", "0.5"))
+
+@st.cache_resource(show_spinner=False)
+def _analysis_service():
+    """AI分析分发器（有上限的线程池 + 结果缓存 + 断路器），进程内所有会话共用；后端见 kpop_analysis"""
+    return kpop_analysis.AnalysisService.from_env()
+
+def generate_ai_analysis(result_role, scores, text):
+    """提交AI分析请求（不阻塞），返回 kpop_analysis.Analysis；提示词和回退文字取自会话语言的 text.ui
+
+    相同的 (角色, 得分, 语言) 在缓存有效期内直接返回缓存的回答，正在请求中的则共用同一个请求；
+    排队已满或后端断路时返回 ai_fallback 固定文字。
+    """
+    prompt = text.ui['ai_prompt'].format(
+        title=text.roles[result_role]['title'], scores=kpop_scoring.scores_to_dict(scores)
+    )
+    key = kpop_analysis.analysis_key(result_role, scores, text.locale)
+    return _analysis_service().request(key, prompt, fallback=text.ui['ai_fallback'])
+
+def request_ai_analysis():
+    """为本会话的结果发出AI分析请求，句柄存在 session_state（重新诊断时随会话状态一起清空）"""
+    record = st.session_state.record
+    st.session_state.ai_analysis = generate_ai_analysis(record.result_role, record.scores, record.text)
+
+def _ai_analysis_html(analysis, ui):
+    if analysis.error is not None:
+        body = ui['ai_error'].format(error=analysis.error)
+    else:
+        body = analysis.text or ui['ai_pending']
+    return f'<div class="result-ai-text">{html.escape(body)}</div>'
+
+def render_ai_analysis():
+    """AI分析文字：已完成时直接显示，否则交给定时刷新的片段逐步显示"""
+    if 'ai_analysis' not in st.session_state:
+        # 例如直接刷新了结果页：此时才发出请求
+        request_ai_analysis()
+    analysis = st.session_state.ai_analysis
+    if analysis.done:
+        st.markdown(_ai_analysis_html(analysis, st.session_state.record.text.ui), unsafe_allow_html=True)
+    else:
+        _stream_ai_analysis()
+
+@st.fragment(run_every=AI_POLL_INTERVAL)
+def _stream_ai_analysis():
+    """定时刷新的片段：显示已收到的部分回答；完成后整页重跑一次，停止刷新"""
+    analysis = st.session_state.ai_analysis
+    if analysis.done:
+        st.rerun()
+    st.markdown(_ai_analysis_html(analysis, st.session_state.record.text.ui), unsafe_allow_html=True)
+
+def render_traits_html(text, tag_counts):
+    """副档案：四种思考风格标签的次数和占比条（标签名取自会话语言）"""
+    esc = html.escape
+    total = max(int(sum(tag_counts)), 1)
+    rows = "".join(
+        '<div class="result-trait">'
+        f'<span class="result-trait-name">{esc(text.tags[tag])}</span>'
+        f'<div class="result-trait-bar"><div style="width: {count / total * 100:.0f}%"></div></div>'
+        f'<span class="result-trait-value">{count}</span>'
+        '</div>'
+        for tag, count in kpop_scoring.tags_to_dict(tag_counts).items()
+    )
+    return (
+        f'<div class="result-card result-card-traits"><h3>{esc(text.ui["traits_heading"])}</h3>'
+        f'<div class="result-traits">{rows}</div></div>'
+    )
+
+def _render_result_templates(text):
+    """预编译一种语言的结果页HTML：{角色: (标题区HTML, 详情区HTML)}"""
+    esc = html.escape
+    ui = text.ui
+    templates = {}
+    for role, role_data in text.roles.items():
+        header = (
+            '<div class="result-header">'
+            f'<div class="result-role">{esc(role_data["title"])}</div>'
+            f'<div class="result-subtitle">{esc(role_data["subtitle"])}</div>'
+            f'<div class="result-description">{esc(role_data["description"])}</div>'
+            '</div>'
+        )
+        strengths = "".join(f'<div class="result-item">{esc(item)}</div>' for item in role_data['strengths'])
+        careers = "".join(f'<div class="result-item">{esc(item)}</div>' for item in role_data['career'])
+        steps = "".join(
+            f'<div class="result-step"><div class="result-step-body">'
+            f'<span class="result-step-number">{i + 1}</span>{esc(step)}</div></div>'
+            for i, step in enumerate(role_data['next_steps'])
+        )
+        details = (
+            '<div class="result-columns">'
+            '<div class="result-items-strengths">'
+            f'<div class="result-card result-card-strengths"><h3>{esc(ui["strengths_heading"])}</h3></div>'
+            f'{strengths}</div>'
+            '<div class="result-items-career">'
+            f'<div class="result-card result-card-career"><h3>{esc(ui["career_heading"])}</h3></div>'
+            f'{careers}</div>'
+            '</div>'
+            f'<div class="result-card result-card-steps"><h3>{esc(ui["steps_heading"])}</h3></div>'
+            f'<div class="result-steps">{steps}</div>'
+            f'<div class="result-card result-card-ai"><h3>{esc(ui["ai_heading"])}</h3></div>'
+        )
+        templates[role] = (header, details)
+    return templates
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def _locale_templates(version):
+    """为内容包的每种语言预编译页面HTML（每个内容版本只构建一次，所有语言一起构建）
+
+    返回 {语言: {"welcome": 欢迎页HTML, "header": 问卷/结果页标题HTML, "results": {角色: (标题区, 详情区)}}}，
+    样式全部在 aespa_cyber_css.css 里。
+    """
+    esc = html.escape
+    templates = {}
+    for locale, text in kpop_content.get_pack(version).texts.items():
+        ui = text.ui
+        templates[locale] = {
+            "welcome": (
+                '<div class="custom-header">'
+                f'<div class="main-title">{esc(ui["welcome_title"])}</div>'
+                f'<div class="main-subtitle">{esc(ui["welcome_subtitle"])}</div>'
+                '</div>'
+                '<div class="welcome-container">'
+                f'<p class="welcome-description">{esc(ui["welcome_description"])}</p>'
+                f'<p class="welcome-teaser">{esc(ui["welcome_teaser"])}</p>'
+                '</div>'
+            ),
+            "header": (
+                '<div class="custom-header">'
+                f'<div class="main-title">{esc(ui["header_title"])}</div>'
+                f'<div class="main-subtitle">{esc(ui["header_subtitle"])}</div>'
+                '</div>'
+            ),
+            "results": _render_result_templates(text),
+        }
+    return templates
+
+def page_templates():
+    """当前会话（内容版本 + 语言）的预编译HTML"""
+    record = st.session_state.record
+    return _locale_templates(record.pack.version)[record.text.locale]
+
+def render_percentile(result_role):
+    """结果角色得分在所有已完成诊断中的排名（「上位 N%」）；人数太少或提前结束时不显示"""
+    record = st.session_state.record
+    if not record.complete:
+        return
+    role_idx = kpop_scoring.ROLE_INDEX[result_role]
+    percent = kpop_stats.top_percent(role_idx, record.scores[role_idx])
+    if percent is None:
+        return
+    label = record.text.ui['percentile'].format(title=record.text.roles[result_role]['title'], percent=percent)
+    st.markdown(f'<div class="result-percentile">{html.escape(label)}</div>', unsafe_allow_html=True)
+
+@kpop_profiling.profiled()
+def render_result():
+    """结果页面 - 预编译的HTML模板 + 雷达图，只产生少量元素"""
+    record = st.session_state.record
+    result_role, co_role = record.result
+    header_html, details_html = page_templates()["results"][result_role]
     
-    # 分栏显示next steps
-    cols = st.columns(len(role_data['next_steps']))
-    for i, step in enumerate(role_data['next_steps']):
-        with cols[i]:
-            st.markdown(f"""
-            <div style="text-align: center; padding: 20px;">
-                <div style="color: #ffffff; font-family: 'Poppins', sans-serif; 
-                           font-size: 1.1em; line-height: 1.5;
-                           background: rgba(255, 255, 255, 0.03); 
-                           border-radius: 15px; padding: 20px;
-                           border: 1px solid rgba(255, 255, 255, 0.1);">
-                    <span style="color: #8a2be2; font-size: 1.5em; margin-bottom: 10px; display: block;">
-                        {i+1}
-                    </span>
-                    {step}
-                </div>
-            </div>
-            """, unsafe_allow_html=True)
+    # 主标题区域（dual 策略下同分时，附上并列的第二个角色）
+    if co_role is not None:
+        dual = record.text.ui['dual_role'].format(title=record.text.roles[co_role]['title'])
+        header_html = f'{header_html}<div class="result-dual">{html.escape(dual)}</div>'
+    st.markdown(header_html, unsafe_allow_html=True)
     
-    # AI分析区块
-    st.markdown("""
-    <div style="background: linear-gradient(135deg, rgba(255, 255, 255, 0.05) 0%, rgba(255, 255, 255, 0.02) 100%);
-                border: 1px solid rgba(0, 255, 255, 0.3); border-radius: 20px; padding: 25px;
-                margin-top: 30px; backdrop-filter: blur(10px);
-                box-shadow: 0 15px 35px rgba(0, 255, 255, 0.1);">
-        <h3 style="color: #00ffff; font-family: 'Orbitron', monospace; 
-                   text-shadow: 0 0 15px #00ffff; margin-bottom: 20px;">
-            🤖 AI個別分析
-        </h3>
-    </div>
-    """, unsafe_allow_html=True)
+    # 雷达图重点展示区域（居中显示）
+    with st.container(key="radar_panel"):
+        col1, col2, col3 = st.columns([1, 2, 1])
+        with col2:
+            fig = render_radar_chart()
+            st.plotly_chart(fig, use_container_width=True)
+            render_percentile(result_role)
     
-    ai_analysis = generate_ai_analysis(result_role, st.session_state.scores)
-    st.markdown(f"""
-    <div style="background: rgba(0, 255, 255, 0.05); border: 1px solid rgba(0, 255, 255, 0.2);
-                border-radius: 15px; padding: 20px; color: #ffffff;
-                font-family: 'Poppins', sans-serif; line-height: 1.6;
-                text-shadow: 0 0 5px rgba(255, 255, 255, 0.3);">
-        {ai_analysis}
-    </div>
-    """, unsafe_allow_html=True)
+    # 思考风格副档案 / 强项 / 推荐职业 / 下一步：合并成一个元素输出；AI分析可能还在生成，单独显示
+    _, tag_counts = record.profile
+    st.markdown(f'{render_traits_html(record.text, tag_counts)}{details_html}', unsafe_allow_html=True)
+    render_ai_analysis()
+
+def _start_test():
+    """「診断を始める」回调：在重跑之前切换页面，不需要再 st.rerun()"""
+    st.session_state.record.start()
+
+def _go_back():
+    """「前へ」回调：保留当前题目的选择，再回到上一题"""
+    question_idx = st.session_state.record.current_question
+    record_answer(question_idx)
+    st.session_state.record.back()
+
+def _submit_answer():
+    """「次へ」/「結果を見る」回调：记录当前题目的选择并前进"""
+    question_idx = st.session_state.record.current_question
+    record_answer(question_idx)
+    st.session_state.record.advance()
+    if kpop_scoring.ADAPTIVE:
+        # 自适应模式：剩下的题已经改变不了结果时直接到结果页
+        st.session_state.record.finish_if_decided()
+    if st.session_state.record.show_result:
+        kpop_metrics.observe_completion(get_result(), st.session_state.get('reruns', 0))
+        # 重新诊断会清空会话状态，结果在这里写进结果日志（后台线程写盘）
+        kpop_results.log_completion(st.session_state.record)
+        if st.session_state.record.complete:
+            # 提前结束的得分只覆盖部分题目，计入人群统计会拉低各角色的分布
+            kpop_stats.observe(st.session_state.record.scores)
+        # 结果页渲染之前就发出AI分析请求，与页面切换并行
+        request_ai_analysis()
+
+def _set_locale():
+    """语言选择回调：切换本会话的语言，并写进 URL（重新诊断时保持）"""
+    locale = st.session_state.locale_select
+    st.session_state.record.locale = locale
+    st.query_params["lang"] = locale
+
+def _restart():
+    """「もう一度診断する」回调：清空会话状态"""
+    for k in list(st.session_state.keys()):
+        del st.session_state[k]
+
+@st.fragment
+@kpop_profiling.profiled()
+def render_question_flow():
+    """问卷流程片段：选项放在表单里，点选不触发重跑；提交按钮只重跑这个片段"""
+    if st.session_state.record.show_result:
+        # 最后一题提交后，需要整页重跑才能切换到结果页
+        st.rerun()
+
+    with track_rerun():
+        # 进度条 + 当前问题
+        render_progress_bar()
+        ui = st.session_state.record.text.ui
+        question_idx = st.session_state.record.current_question
+        with st.form(key=f"question_form_{question_idx}", border=False):
+            render_question()
+
+            # 导航按钮：左右对称布局
+            left_col, right_col = st.columns([1, 1], gap="large")
+            
+            with left_col:
+                # 左侧：返回按钮（不是第一题时才显示）
+                if question_idx > 0:
+                    st.form_submit_button(ui['prev_button'], key="prev_btn", on_click=_go_back)
+
+            with right_col:
+                # 不是最后一题：显示"次へ"，最后一题：显示"結果を見る"
+                if question_idx < st.session_state.record.pack.question_count - 1:
+                    st.form_submit_button(ui['next_button'], key="next_btn", on_click=_submit_answer)
+                else:
+                    st.form_submit_button(ui['result_button'], key="result_btn", on_click=_submit_answer)
 
 def main():
     """主函数：从欢迎页 → 问卷页 → 结果页的完整流程"""
-    # 清理可能冲突的radio keys
-    keys_to_remove = [k for k in st.session_state.keys() if k.startswith(('question_', 'radio_'))]
-    for key in keys_to_remove:
-        del st.session_state[key]
-
     # 1. 初始化 session state 并加载自定义 CSS
     initialize_session_state()
     load_css()
 
+    record = st.session_state.record
+    templates = page_templates()
+
     # 2. 欢迎页：首次进入或重置后显示
-    if st.session_state.show_welcome:
-        # 欢迎页顶部导航 - 把大标题放在容器里
-        st.markdown("""
-        <div class="custom-header">
-            <div class="main-title">🎵 K-pop創作適性診断</div>
-            <div class="main-subtitle">K-popの未来をつくるのは、キミかも？</div>
-        </div>
-        """, unsafe_allow_html=True)
-
-        # 欢迎文字 - 移除重复的标题
-        st.markdown("""
-        <div class="welcome-container">
-            <p class="welcome-description">10問で今すぐ診断する！</p>
-            <p class="welcome-teaser">5分でわかる、あなたの"クリエイタータイプ"</p>
-        </div>
-        """, unsafe_allow_html=True)
+    if record.show_welcome:
+        # 欢迎页顶部标题 + 欢迎文字（按语言预编译）
+        st.markdown(templates["welcome"], unsafe_allow_html=True)
 
-        # 开始按钮
-        if st.button("診断を始める", key="welcome_start", use_container_width=True):
-            st.session_state.show_welcome = False
-            st.rerun()
+        # 语言选择：只在开始答题前可以切换
+        pack = record.pack
+        if len(pack.locales) > 1:
+            st.radio(
+                record.text.ui['language'],
+                pack.locales,
+                index=pack.locales.index(record.text.locale),
+                format_func=lambda locale: pack.text(locale).name,
+                key="locale_select",
+                horizontal=True,
+                label_visibility="collapsed",
+                on_change=_set_locale
+            )
 
-        # 关闭容器
-        st.markdown('</div>', unsafe_allow_html=True)
+        # 开始按钮
+        st.button(record.text.ui['start_button'], key="welcome_start", use_container_width=True, on_click=_start_test)
         return  # 只渲染欢迎页，其它逻辑暂不执行
 
     # 3. 问卷页和结果页顶部导航
-    st.markdown("""
-    <div class="custom-header">
-        <div class="main-title">🎵 K-pop創作プロセス適性診断</div>
-        <div class="main-subtitle">あなたの創作での最適ポジションを発見しよう</div>
-    </div>
-    """, unsafe_allow_html=True)
+    st.markdown(templates["header"], unsafe_allow_html=True)
 
 
-    # 5. 问卷流程：未查看结果时
-    if not st.session_state.show_result:
-        # 5.1 进度条 + 当前问题
-        render_progress_bar()
-        selected = render_question()
-
-        # 5.2 导航按钮：左右对称布局
-        left_col, right_col = st.columns([1, 1], gap="large")
-        
-        with left_col:
-            # 左侧：返回按钮（不是第一题时才显示）
-            if st.session_state.current_question > 0:
-                if st.button("⬅️ 前へ", key="prev_btn"):
-                    st.session_state.current_question -= 1
-                    st.rerun()
-
-        with right_col:
-            # 右侧：前进按钮（选择了选项时才显示）
-            if selected:
-                # 不是最后一题：显示"次へ"
-                if st.session_state.current_question < len(QUESTIONS) - 1:
-                    if st.button("次へ ➡️", key="next_btn"):
-                        calculate_scores(selected, st.session_state.current_question)
-                        st.session_state.answers.append(selected)
-                        st.session_state.current_question += 1
-                        st.rerun()
-                # 最后一题：显示"結果を見る"
-                else:
-                    if st.button("🎯 結果を見る", key="result_btn"):
-                        calculate_scores(selected, st.session_state.current_question)
-                        st.session_state.answers.append(selected)
-                        st.session_state.show_result = True
-                        st.rerun()
+    # 5. 问卷流程：未查看结果时（片段内重跑，不会重新执行上面的CSS和标题）
+    if not st.session_state.record.show_result:
+        render_question_flow()
 
     # 6. 结果页
     else:
         render_result()
-        if st.button("🔄 もう一度診断する", key="restart_btn"):
-            for k in list(st.session_state.keys()):
-                del st.session_state[k]
-            st.rerun()
+        st.button(record.text.ui['restart_button'], key="restart_btn", on_click=_restart)
+
+
+def current_page():
+    """当前页面标签（用于指标）：welcome / question_N / result"""
+    record = st.session_state.get('record')
+    return record.page if record is not None else "welcome"
+
+
+@contextmanager
+def track_rerun():
+    """统计一次整页或片段重跑（次数 + 按页面的耗时）；嵌套时只统计最外层"""
+    if st.session_state.get('_tracking_rerun'):
+        yield
+        return
+
+    page = current_page()
+    st.session_state._tracking_rerun = True
+    st.session_state.reruns = st.session_state.get('reruns', 0) + 1
+    rerun_start = time.perf_counter()
+    try:
+        with kpop_profiling.timed("rerun"):
+            yield
+    finally:
+        st.session_state._tracking_rerun = False
+        kpop_metrics.observe_rerun(page, time.perf_counter() - rerun_start)
+        kpop_profiling.dump_throttled()
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    with track_rerun():
+        main()
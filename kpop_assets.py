@@ -0,0 +1,234 @@
+"""静态资源管线 - 样式表每个进程只读取、压缩一次，并以带内容哈希的静态文件提供给浏览器缓存
+
+开发时修改 aespa_cyber_css.css 后会按文件修改时间自动重新加载。
+静态文件需要在 .streamlit/config.toml 中开启 server.enableStaticServing，
+否则退回到内联 <style>（仍然使用压缩后的缓存字符串）。
+
+离线字体模式（KPOP_OFFLINE_FONTS=1）：去掉 Google Fonts 的 @import，
+改用本地子集化的 WOFF2。每种语言单独子集化（只含该语言用到的字形），
+样式表也按语言分别缓存和发布。字体文件需先构建：
+
+    pip install fonttools brotli
+    python -m kpop_assets build-fonts --src ./fonts_src
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import string
+import sys
+import threading
+
+import kpop_content
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+CSS_PATH = os.path.join(APP_DIR, "aespa_cyber_css.css")
+STATIC_DIR = os.path.join(APP_DIR, "static")
+STATIC_URL = "app/static"
+FONT_DIR = os.path.join(STATIC_DIR, "fonts")
+FONT_MANIFEST = os.path.join(FONT_DIR, "fonts.json")
+
+# (字体族, 字重, Google Fonts 源字体文件名, 适用语言；None 表示所有语言)；Orbitron 用于雷达图
+FONT_FACES = (
+    ("Poppins", "300", "Poppins-Light.ttf", None),
+    ("Poppins", "400", "Poppins-Regular.ttf", None),
+    ("Poppins", "600", "Poppins-SemiBold.ttf", None),
+    ("Poppins", "700", "Poppins-Bold.ttf", None),
+    ("Poppins", "800", "Poppins-ExtraBold.ttf", None),
+    ("M PLUS Rounded 1c", "300", "MPLUSRounded1c-Light.ttf", None),
+    ("M PLUS Rounded 1c", "400", "MPLUSRounded1c-Regular.ttf", None),
+    ("M PLUS Rounded 1c", "500", "MPLUSRounded1c-Medium.ttf", None),
+    ("M PLUS Rounded 1c", "700", "MPLUSRounded1c-Bold.ttf", None),
+    ("Noto Sans KR", "100 900", "NotoSansKR[wght].ttf", ("ko",)),
+    ("Orbitron", "400 900", "Orbitron[wght].ttf", None),
+)
+FONT_DISPLAY_VALUES = ("auto", "block", "swap", "fallback", "optional")
+
+OFFLINE_FONTS = os.environ.get("KPOP_OFFLINE_FONTS", "") not in ("", "0")
+FONT_DISPLAY = os.environ.get("KPOP_FONT_DISPLAY", "swap")
+if FONT_DISPLAY not in FONT_DISPLAY_VALUES:
+    FONT_DISPLAY = "swap"
+
+_COMMENT_RE = re.compile(r"/\*.*?\*/", re.S)
+_SPACE_RE = re.compile(r"\s+")
+_PUNCT_RE = re.compile(r"\s*([{};,>])\s*")
+_COLON_RE = re.compile(r":\s+")
+_FONT_IMPORT_RE = re.compile(r"@import\s+url\([^)]*fonts\.googleapis\.com[^)]*\)\s*;")
+
+_lock = threading.Lock()
+# (样式表路径, 字体URL前缀, 语言) -> {"mtime", "css", "digest", "url"}
+_cache = {}
+
+
+def minify_css(css):
+    """去掉注释和多余空白（保守压缩，不改写选择器和属性值）"""
+    css = _COMMENT_RE.sub("", css)
+    css = _SPACE_RE.sub(" ", css)
+    css = _PUNCT_RE.sub(r"\1", css)
+    css = _COLON_RE.sub(":", css)
+    return css.replace(";}", "}").strip()
+
+
+def load_font_manifest():
+    """读取 build-fonts 生成的字体清单，没有构建过时返回空列表"""
+    try:
+        with open(FONT_MANIFEST, "r", encoding="utf-8") as f:
+            return json.load(f)["faces"]
+    except (OSError, ValueError, KeyError):
+        return []
+
+
+def font_face_css(font_base, locale=None):
+    """根据字体清单生成某种语言的本地 @font-face 规则，font-display 由 KPOP_FONT_DISPLAY 控制"""
+    return "".join(
+        f"@font-face{{font-family:'{face['family']}';font-style:normal;"
+        f"font-weight:{face['weight']};font-display:{FONT_DISPLAY};"
+        f"src:url('{font_base}/{face['file']}') format('woff2')}}"
+        for face in load_font_manifest()
+        if face.get('locale') == locale
+    )
+
+
+def _source_mtime(path):
+    """缓存失效的依据：样式表修改时间 +（离线模式下）字体清单修改时间"""
+    mtime = os.stat(path).st_mtime_ns
+    if OFFLINE_FONTS and os.path.exists(FONT_MANIFEST):
+        mtime = (mtime, os.stat(FONT_MANIFEST).st_mtime_ns)
+    return mtime
+
+
+def load_stylesheet(path=CSS_PATH, font_base="fonts", locale=None):
+    """读取并压缩样式表；文件修改时间没变时直接返回缓存
+
+    font_base 是本地字体相对于样式表所在位置的URL前缀，locale 选择该语言的字体子集，
+    两者仅离线字体模式使用（在线模式下所有语言共用同一份样式表）。
+    """
+    if not OFFLINE_FONTS:
+        locale = None
+    elif locale is None:
+        locale = kpop_content.DEFAULT_PACK.locale
+    key = (path, font_base, locale)
+    mtime = _source_mtime(path)
+    entry = _cache.get(key)
+    if entry is not None and entry["mtime"] == mtime:
+        return entry
+
+    with _lock:
+        entry = _cache.get(key)
+        if entry is None or entry["mtime"] != mtime:
+            with open(path, "r", encoding="utf-8") as f:
+                css = f.read()
+            if OFFLINE_FONTS:
+                css = font_face_css(font_base, locale) + _FONT_IMPORT_RE.sub("", css)
+            css = minify_css(css)
+            entry = {
+                "mtime": mtime,
+                "css": css,
+                "digest": hashlib.sha1(css.encode("utf-8")).hexdigest()[:12],
+                "url": None,
+                "locale": locale,
+            }
+            _cache[key] = entry
+    return entry
+
+
+def publish_stylesheet(path=CSS_PATH, locale=None):
+    """把压缩后的样式表写成 static/<名称>[.<语言>].<哈希>.min.css，返回其URL；写入失败返回 None"""
+    entry = load_stylesheet(path, locale=locale)
+    if entry["url"] is not None:
+        return entry["url"]
+
+    stem = os.path.splitext(os.path.basename(path))[0]
+    if entry["locale"] is not None:
+        stem = f"{stem}.{entry['locale']}"
+    filename = f"{stem}.{entry['digest']}.min.css"
+    target = os.path.join(STATIC_DIR, filename)
+    with _lock:
+        try:
+            if not os.path.exists(target):
+                os.makedirs(STATIC_DIR, exist_ok=True)
+                tmp_path = f"{target}.{os.getpid()}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    f.write(entry["css"])
+                os.replace(tmp_path, target)
+                # 清理旧版本，避免开发时 static/ 越积越多
+                for old in os.listdir(STATIC_DIR):
+                    if old.startswith(f"{stem}.") and old.endswith(".min.css") and old != filename:
+                        os.remove(os.path.join(STATIC_DIR, old))
+        except OSError:
+            return None
+
+    entry["url"] = f"{STATIC_URL}/{filename}"
+    return entry["url"]
+
+
+def stylesheet_tag(static_serving, path=CSS_PATH, locale=None):
+    """返回注入页面的HTML：静态服务可用时只发一个 <link>，否则内联压缩后的 <style>"""
+    url = publish_stylesheet(path, locale) if static_serving else None
+    if url is not None:
+        return f'<link rel="stylesheet" href="{url}">'
+    return f"<style>{load_stylesheet(path, f'{STATIC_URL}/fonts', locale)['css']}</style>"
+
+
+def font_subset_text(locale=None):
+    """某种语言子集化需要保留的字符：可打印ASCII + 该语言的题目/角色/界面文字/标签名
+
+    欢迎页的语言选择器在每种语言的页面上都列出所有语言的名称，所以各语言的 name 都要包含。
+    """
+    pack = kpop_content.DEFAULT_PACK
+    text = pack.text(locale)
+    names = [pack.text(other).name for other in pack.locales]
+    chars = set(string.printable)
+    chars.update(json.dumps([text.questions, text.roles, text.ui, text.tags, names], ensure_ascii=False))
+    return "".join(sorted(c for c in chars if c == " " or not c.isspace()))
+
+
+def build_fonts(src_dir, out_dir=FONT_DIR):
+    """把 src_dir 中的源字体按语言子集化为 WOFF2，并写出字体清单"""
+    from fontTools import subset  # 仅构建时需要：pip install fonttools brotli
+
+    os.makedirs(out_dir, exist_ok=True)
+    faces, glyphs = [], {}
+    for locale in kpop_content.DEFAULT_PACK.locales:
+        text = font_subset_text(locale)
+        glyphs[locale] = len(text)
+        for family, weight, source, locales in FONT_FACES:
+            if locales is not None and locale not in locales:
+                continue
+            source_path = os.path.join(src_dir, source)
+            if not os.path.exists(source_path):
+                print(f"跳过：找不到源字体 {source_path}", file=sys.stderr)
+                continue
+            filename = f"{family.replace(' ', '')}-{weight.replace(' ', '-')}.{locale}.woff2"
+            options = subset.Options()
+            options.flavor = "woff2"
+            options.layout_features = ["*"]
+            font = subset.load_font(source_path, options)
+            subsetter = subset.Subsetter(options)
+            subsetter.populate(text=text)
+            subsetter.subset(font)
+            subset.save_font(font, os.path.join(out_dir, filename), options)
+            faces.append({"family": family, "weight": weight, "file": filename, "locale": locale})
+            print(f"{filename}: {os.path.getsize(os.path.join(out_dir, filename))} bytes")
+
+    with open(os.path.join(out_dir, "fonts.json"), "w", encoding="utf-8") as f:
+        json.dump({"faces": faces, "glyphs": glyphs}, f, ensure_ascii=False, indent=2)
+    return faces
+
+
+def main(argv=None):
+    """命令行入口：构建离线字体包"""
+    parser = argparse.ArgumentParser(prog="python -m kpop_assets", description="静态资源构建工具")
+    commands = parser.add_subparsers(dest="command", required=True)
+    fonts = commands.add_parser("build-fonts", help="子集化字体并生成 static/fonts/")
+    fonts.add_argument("--src", required=True, help="Google Fonts 源字体（.ttf）所在目录")
+    fonts.add_argument("--out", default=FONT_DIR, help="输出目录")
+    args = parser.parse_args(argv)
+
+    if args.command == "build-fonts":
+        build_fonts(args.src, args.out)
+
+
+if __name__ == "__main__":
+    main()
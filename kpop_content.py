@@ -0,0 +1,534 @@
+"""K-pop創作適性診断 - 内容包（问题与角色数据）的加载、校验与预编译缓存（不依赖Streamlit）
+
+内容放在 content/ja.json（可用环境变量 KPOP_CONTENT 指定其它文件）。
+加载时先校验：每个 weights 必须正好覆盖六个角色，tags 只能用 TAG_KEYS 里的标签。
+校验并编译后的内容包按文件 sha256 缓存到 .cache/，之后启动直接读取二进制缓存。
+编辑内容文件后无需重启：start_watcher() 启动的后台线程发现文件变化后在线程里编译新版本，
+再原子地切换 active_pack()；进行中的会话持有开始时的内容包，一直用到结束（get_pack 也能按版本取到）。
+
+多语言：基础内容包的 "translations" 列出同目录下的翻译文件（如 content/en.json），
+翻译文件只有文字（题目、选项、角色说明、界面文字），权重张量和标签由所有语言共用。
+
+    python -m kpop_content check content/ja.json
+"""
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import string
+import sys
+import threading
+import time
+import traceback
+import weakref
+from collections import deque
+
+import numpy as np
+
+if __name__ == "__main__":
+    # python -m kpop_content：交给正常导入的模块执行。否则这个文件里的类是 __main__.ContentPack，
+    # 写进 .cache/ 的缓存应用读不了，应用写的缓存这里也认不出
+    import kpop_content
+    sys.exit(kpop_content.main())
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+CONTENT_PATH = os.environ.get("KPOP_CONTENT", os.path.join(APP_DIR, "content", "ja.json"))
+CACHE_DIR = os.path.join(APP_DIR, ".cache")
+# 后台线程检查内容文件的间隔（秒）
+POLL_INTERVAL = float(os.environ.get("KPOP_CONTENT_POLL", "2"))
+# 没有会话引用时也保留的最近内容版本数；还有会话在用的旧版本不受此限制
+PACK_HISTORY = 8
+# 缓存格式变化时递增，旧缓存自动失效
+CACHE_FORMAT = 5
+
+# 角色顺序固定（同分时取靠前的角色）
+ROLE_KEYS = ('concept', 'producer', 'lyric', 'visual', 'performance', 'fan')
+ROLE_INDEX = {role: i for i, role in enumerate(ROLE_KEYS)}
+TAG_KEYS = ('Analytical', 'Creative', 'Coordinative', 'Performing')
+TAG_INDEX = {tag: i for i, tag in enumerate(TAG_KEYS)}
+ROLE_TEXT_FIELDS = ('title', 'subtitle', 'description')
+ROLE_LIST_FIELDS = ('strengths', 'career', 'next_steps')
+# 界面文字（每种语言都必须提供；花括号里的占位符见 UI_PLACEHOLDERS）
+UI_KEYS = (
+    'welcome_title', 'welcome_subtitle', 'welcome_description', 'welcome_teaser', 'start_button', 'language',
+    'header_title', 'header_subtitle', 'progress', 'choose',
+    'prev_button', 'next_button', 'result_button', 'restart_button',
+    'strengths_heading', 'career_heading', 'steps_heading', 'ai_heading', 'traits_heading', 'dual_role', 'percentile',
+    'radar_title', 'radar_trace',
+    'ai_fallback', 'ai_pending', 'ai_error', 'ai_prompt',
+)
+# 应用调用 str.format 时传入的字段：这些界面文字必须正好使用这些占位符，其余界面文字不能有占位符
+UI_PLACEHOLDERS = {
+    'progress': {'current', 'total'},
+    'dual_role': {'title'},
+    'percentile': {'title', 'percent'},
+    'ai_error': {'error'},
+    'ai_prompt': {'title', 'scores'},
+}
+# 答卷每题用1字节保存选项序号，0xFF 留作「未作答」
+MAX_OPTIONS = 0xFF
+
+
+class ContentError(ValueError):
+    """内容包校验失败"""
+
+
+def _placeholders(text):
+    return {field for _, field, _, _ in string.Formatter().parse(text) if field is not None}
+
+
+def _check_header(data, errors):
+    """语言代码、语言名称、界面文字和标签的显示名称"""
+    for field in ('locale', 'name'):
+        if not isinstance(data.get(field), str) or not data.get(field):
+            errors.append(f"缺少 {field}")
+    ui = data.get('ui')
+    if not isinstance(ui, dict) or set(ui) != set(UI_KEYS):
+        errors.append(f"ui 必须正好包含 {', '.join(UI_KEYS)}")
+    elif not all(isinstance(text, str) for text in ui.values()):
+        errors.append("ui 的值必须是字符串")
+    else:
+        for key in UI_KEYS:
+            expected = UI_PLACEHOLDERS.get(key, set())
+            try:
+                found = _placeholders(ui[key])
+            except ValueError as e:
+                errors.append(f"ui.{key}: 花括号格式错误（{e}）")
+                continue
+            if found != expected:
+                errors.append(f"ui.{key}: 占位符应为 {sorted(expected)}，实际为 {sorted(found)}")
+    tags = data.get('tags')
+    if not isinstance(tags, dict) or set(tags) != set(TAG_KEYS):
+        errors.append(f"tags 必须正好包含 {', '.join(TAG_KEYS)} 的显示名称")
+    elif not all(isinstance(name, str) for name in tags.values()):
+        errors.append("tags 的值必须是字符串")
+
+
+def _check_roles(roles, errors):
+    if not isinstance(roles, dict) or set(roles) != set(ROLE_KEYS):
+        errors.append(f"roles 必须正好包含 {', '.join(ROLE_KEYS)}")
+        return
+    for role, role_data in roles.items():
+        if not isinstance(role_data, dict):
+            errors.append(f"roles.{role}: 必须是对象")
+            continue
+        for field in ROLE_TEXT_FIELDS:
+            if not isinstance(role_data.get(field), str):
+                errors.append(f"roles.{role}: 缺少 {field}")
+        for field in ROLE_LIST_FIELDS:
+            items = role_data.get(field)
+            if not isinstance(items, list) or not all(isinstance(item, str) for item in items):
+                errors.append(f"roles.{role}: {field} 必须是字符串列表")
+
+
+def validate_content(data):
+    """校验基础内容包结构，发现问题时抛出 ContentError（列出全部问题）"""
+    errors = []
+    if not isinstance(data, dict):
+        raise ContentError("内容包必须是一个对象")
+    _check_header(data, errors)
+    translations = data.get('translations', [])
+    if not isinstance(translations, list) or not all(isinstance(code, str) and code for code in translations):
+        errors.append("translations 必须是语言代码列表")
+
+    questions = data.get('questions')
+    if not isinstance(questions, list) or not questions:
+        errors.append("questions 必须是非空列表")
+        questions = []
+    for q, question in enumerate(questions, 1):
+        where = f"questions[{q}]"
+        if not isinstance(question, dict) or not isinstance(question.get('text'), str):
+            errors.append(f"{where}: 缺少 text")
+            continue
+        options = question.get('options')
+        if not isinstance(options, list) or not options or len(options) > MAX_OPTIONS - 1:
+            errors.append(f"{where}: options 必须是 1~{MAX_OPTIONS - 1} 个选项的列表")
+            continue
+        for o, option in enumerate(options, 1):
+            where = f"questions[{q}].options[{o}]"
+            if not isinstance(option, dict):
+                errors.append(f"{where}: 必须是对象")
+                continue
+            for field in ('text', 'desc'):
+                if not isinstance(option.get(field), str):
+                    errors.append(f"{where}: 缺少 {field}")
+            weights = option.get('weights')
+            if not isinstance(weights, dict) or set(weights) != set(ROLE_KEYS):
+                errors.append(f"{where}: weights 必须正好包含 {', '.join(ROLE_KEYS)}")
+            elif not all(isinstance(w, int) and not isinstance(w, bool) and 0 <= w <= 100 for w in weights.values()):
+                errors.append(f"{where}: weights 必须是 0~100 的整数")
+            tags = option.get('tags', [])
+            if not isinstance(tags, list):
+                errors.append(f"{where}: tags 必须是列表")
+            else:
+                unknown = [tag for tag in tags if tag not in TAG_KEYS]
+                if unknown:
+                    errors.append(f"{where}: 未知的 tags {unknown}（可用：{', '.join(TAG_KEYS)}）")
+
+    _check_roles(data.get('roles'), errors)
+    if errors:
+        raise ContentError("\n".join(errors))
+
+
+def validate_translation(data, base):
+    """校验翻译文件：结构必须与基础内容包一一对应，且不能另写权重和标签"""
+    errors = []
+    if not isinstance(data, dict):
+        raise ContentError("翻译文件必须是一个对象")
+    _check_header(data, errors)  # 界面文字的占位符与基础内容包一样按 UI_PLACEHOLDERS 检查
+
+    questions = data.get('questions')
+    if not isinstance(questions, list) or len(questions) != len(base['questions']):
+        errors.append(f"questions 必须是 {len(base['questions'])} 道题的列表")
+        questions = []
+    for q, (question, base_question) in enumerate(zip(questions, base['questions']), 1):
+        where = f"questions[{q}]"
+        if not isinstance(question, dict) or not isinstance(question.get('text'), str):
+            errors.append(f"{where}: 缺少 text")
+            continue
+        options = question.get('options')
+        if not isinstance(options, list) or len(options) != len(base_question['options']):
+            errors.append(f"{where}: options 必须有 {len(base_question['options'])} 个选项")
+            continue
+        for o, option in enumerate(options, 1):
+            where = f"questions[{q}].options[{o}]"
+            if not isinstance(option, dict) or set(option) != {'text', 'desc'}:
+                errors.append(f"{where}: 只能包含 text 和 desc（权重与标签由基础内容包提供）")
+            elif not all(isinstance(option[field], str) for field in ('text', 'desc')):
+                errors.append(f"{where}: text / desc 必须是字符串")
+
+    _check_roles(data.get('roles'), errors)
+    if errors:
+        raise ContentError("\n".join(errors))
+
+
+def compile_questions(questions):
+    """把问题列表编译成只读的整数权重张量 (问题 × 选项 × 角色)，选项数不足的位置补0"""
+    n_options = max(len(question['options']) for question in questions)
+    weights = np.zeros((len(questions), n_options, len(ROLE_KEYS)), dtype=np.int16)
+    for q, question in enumerate(questions):
+        for o, option in enumerate(question['options']):
+            for role, weight in option['weights'].items():
+                weights[q, o, ROLE_INDEX[role]] = weight
+    weights.setflags(write=False)
+    return weights
+
+
+def compile_tag_masks(questions):
+    """把每个选项的 tags 编译成位掩码 (问题 × 选项)，第 i 位对应 TAG_KEYS[i]"""
+    n_options = max(len(question['options']) for question in questions)
+    masks = np.zeros((len(questions), n_options), dtype=np.uint8)
+    for q, question in enumerate(questions):
+        for o, option in enumerate(question['options']):
+            for tag in option.get('tags', ()):
+                masks[q, o] |= 1 << TAG_INDEX[tag]
+    masks.setflags(write=False)
+    return masks
+
+
+def compile_option_table(weights, tag_masks):
+    """角色权重和展开后的标签位拼成一张表 (问题 × 选项 × (角色数 + 标签数))
+
+    一次 gather + sum 同时得到角色得分和标签计数。
+    """
+    tag_bits = (tag_masks[..., None] >> np.arange(len(TAG_KEYS), dtype=np.uint8)) & 1
+    table = np.concatenate((weights, tag_bits.astype(weights.dtype)), axis=-1)
+    table.setflags(write=False)
+    return table
+
+
+class LocaleText:
+    """一种语言的全部文字（只读）"""
+
+    __slots__ = ("locale", "name", "questions", "roles", "ui", "tags", "option_labels")
+
+    def __init__(self, data):
+        self.locale = data['locale']
+        self.name = data['name']
+        self.questions = data['questions']
+        self.roles = data['roles']
+        self.ui = data['ui']
+        # 标签的显示名称：{标签: 名称}
+        self.tags = data['tags']
+        # 每题的选项展示文本（「text — desc」），之后直接按序号取
+        self.option_labels = tuple(
+            tuple(f"{option['text']} — {option['desc']}" for option in question['options'])
+            for question in self.questions
+        )
+
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            object.__setattr__(self, name, value)
+
+
+class ContentPack:
+    """校验并预编译过的内容包（只读）：一份权重张量 + 每种语言的文字"""
+
+    # 序列化到 .cache/ 的字段；__weakref__ 只供版本登记表使用，不属于内容，也不能写入
+    _FIELDS = (
+        "version", "sources", "locale", "texts",
+        "weights", "tag_masks", "option_table", "option_counts", "weights_digest",
+    )
+    __slots__ = _FIELDS + ("__weakref__",)
+
+    def __init__(self, data, translations, version, sources):
+        self.version = version
+        # 内容包由哪些文件组成（基础文件在前），热更新时检查这些文件
+        self.sources = sources
+        self.locale = data['locale']
+        self.texts = {self.locale: LocaleText(data)}
+        for translation in translations:
+            self.texts[translation['locale']] = LocaleText(translation)
+        self.weights = compile_questions(data['questions'])
+        self.tag_masks = compile_tag_masks(data['questions'])
+        self.option_table = compile_option_table(self.weights, self.tag_masks)
+        self.option_counts = np.array([len(question['options']) for question in data['questions']], dtype=np.intp)
+        self.option_counts.setflags(write=False)
+        # 权重张量的指纹，用来判断预计算的结果表是否过期
+        digest = hashlib.sha1(self.weights.tobytes())
+        digest.update(self.option_counts.tobytes())
+        digest.update(repr(self.weights.shape).encode())
+        self.weights_digest = digest.hexdigest()
+
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in self._FIELDS}
+
+    def __setstate__(self, state):
+        for name in self._FIELDS:
+            object.__setattr__(self, name, state[name])
+        for array in (self.weights, self.tag_masks, self.option_table, self.option_counts):
+            array.setflags(write=False)
+
+    @property
+    def locales(self):
+        """可用的语言代码（基础语言在前）"""
+        return tuple(self.texts)
+
+    def text(self, locale=None):
+        """某种语言的文字；没有该语言时返回基础语言"""
+        return self.texts.get(locale) or self.texts[self.locale]
+
+    # 基础语言的文字（离线工具使用）
+    @property
+    def questions(self):
+        return self.texts[self.locale].questions
+
+    @property
+    def roles(self):
+        return self.texts[self.locale].roles
+
+    @property
+    def option_labels(self):
+        return self.texts[self.locale].option_labels
+
+    @property
+    def question_count(self):
+        return len(self.option_counts)
+
+
+def _file_digest(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _translation_path(path, locale):
+    return os.path.join(os.path.dirname(os.path.abspath(path)), f"{locale}.json")
+
+
+def _cache_path(path, base_digest):
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(CACHE_DIR, f"{stem}.{base_digest[:16]}.v{CACHE_FORMAT}.pickle")
+
+
+def _load_cached(cache_path):
+    """读取二进制缓存；没有缓存时返回 None，缓存损坏时报告到 stderr 并返回 None（之后重新编译覆盖）"""
+    try:
+        with open(cache_path, "rb") as f:
+            pack = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError, KeyError) as e:
+        print(f"kpop_content: 缓存 {cache_path} 无法读取，重新编译: {e!r}", file=sys.stderr)
+        return None
+    if not isinstance(pack, ContentPack):
+        print(f"kpop_content: 缓存 {cache_path} 的内容不是内容包，重新编译", file=sys.stderr)
+        return None
+    return pack
+
+
+def _pack_version(digests):
+    return hashlib.sha256("".join(digests).encode()).hexdigest()[:16]
+
+
+def load_pack(path=CONTENT_PATH):
+    """读取内容包：命中 .cache/ 的二进制缓存时直接反序列化，否则解析 + 校验 + 编译后写缓存
+
+    缓存按基础文件的 sha256 命名；命中后再核对各翻译文件的 sha256，任何文件变化都会重新编译。
+    """
+    with open(path, "rb") as f:
+        raw = f.read()
+    base_digest = hashlib.sha256(raw).hexdigest()
+
+    cache_path = _cache_path(path, base_digest)
+    pack = _load_cached(cache_path)
+    if pack is not None:
+        digests = [base_digest] + [_file_digest(source) for source in pack.sources[1:]]
+        if pack.version == _pack_version(digests):
+            return pack
+
+    data = json.loads(raw.decode("utf-8"))
+    validate_content(data)
+    sources, digests, translations = [os.path.abspath(path)], [base_digest], []
+    for locale in data.get('translations', []):
+        translation_path = _translation_path(path, locale)
+        with open(translation_path, "rb") as f:
+            translation_raw = f.read()
+        translation = json.loads(translation_raw.decode("utf-8"))
+        try:
+            validate_translation(translation, data)
+        except ContentError as e:
+            raise ContentError(f"{translation_path}:\n{e}") from None
+        if translation['locale'] != locale:
+            raise ContentError(f"{translation_path}: locale 应为 {locale}")
+        sources.append(translation_path)
+        digests.append(hashlib.sha256(translation_raw).hexdigest())
+        translations.append(translation)
+
+    pack = ContentPack(data, translations, _pack_version(digests), tuple(sources))
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(pack, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        pass
+    return pack
+
+
+_lock = threading.Lock()
+# 已加载的内容包：版本 -> ContentPack。弱引用：会话（kpop_session.SessionRecord）持有自己的内容包，
+# 只要还有会话在用，旧版本就一直能取到；另外最近的 PACK_HISTORY 个版本始终保留
+_packs = weakref.WeakValueDictionary()
+_recent = deque(maxlen=PACK_HISTORY)
+_active = None
+_active_mtime = None
+
+
+def _content_mtime(pack):
+    """内容文件（基础文件 + 当前内容包的翻译文件）的修改时间；文件缺失记为 None"""
+    mtimes = []
+    for source in (os.path.abspath(CONTENT_PATH),) + pack.sources[1:]:
+        try:
+            mtimes.append(os.stat(source).st_mtime_ns)
+        except OSError:
+            mtimes.append(None)
+    return tuple(mtimes)
+
+
+def _activate(pack, mtime):
+    """登记并切换到新的内容包；只有一次引用赋值，读取方不需要加锁"""
+    global _active, _active_mtime
+    _packs[pack.version] = pack
+    _recent.append(pack)
+    _active, _active_mtime = pack, mtime
+
+
+def reload_if_changed():
+    """内容文件变化时加载新版本并切换；返回新的内容包，没有变化或新内容无效时返回 None"""
+    global _active_mtime
+    mtime = _content_mtime(_active)
+    if mtime == _active_mtime:
+        return None
+
+    with _lock:
+        if mtime == _active_mtime:
+            return None
+        try:
+            pack = load_pack(CONTENT_PATH)
+        except (OSError, ValueError) as e:
+            # 编辑到一半或校验失败：继续使用旧版本，文件再次修改时重试
+            print(f"kpop_content: 新内容无效，继续使用版本 {_active.version}:\n{e}", file=sys.stderr)
+            _active_mtime = mtime
+            return None
+        except Exception:
+            # 意外的错误（内容格式不对导致编译出错等）：同样等文件再次修改再试，由调用方报告
+            _active_mtime = mtime
+            raise
+        if pack.version == _active.version:
+            _active_mtime = mtime
+            return None
+        _activate(pack, _content_mtime(pack))
+    return pack
+
+
+def active_pack():
+    """当前生效的内容包（新开始的会话使用）"""
+    return _active
+
+
+def get_pack(version):
+    """按版本取内容包；版本既不在最近的 PACK_HISTORY 个里、也没有会话在用时抛出 KeyError
+
+    不会退回到当前内容包：题数或选项数不同的内容包会让旧答卷越界。
+    """
+    pack = _packs.get(version)
+    if pack is None:
+        raise KeyError(f"内容版本 {version} 已不在内存中")
+    return pack
+
+
+def _watch_loop(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            reload_if_changed()
+        except Exception:
+            # 不能让后台线程退出：否则热更新会一直停到进程重启
+            print(f"kpop_content: 热更新出错，继续使用版本 {_active.version}:", file=sys.stderr)
+            traceback.print_exc()
+
+
+_watcher_started = False
+
+
+def start_watcher(interval=POLL_INTERVAL):
+    """启动检查内容文件的后台线程（每个进程只启动一次）"""
+    global _watcher_started
+    with _lock:
+        if _watcher_started or interval <= 0:
+            return
+        _watcher_started = True
+    threading.Thread(target=_watch_loop, args=(interval,), name="kpop-content-watcher", daemon=True).start()
+
+
+# 导入时的内容（供离线工具使用；应用内请通过 active_pack() / get_pack() 获取）
+DEFAULT_PACK = load_pack(CONTENT_PATH)
+_activate(DEFAULT_PACK, _content_mtime(DEFAULT_PACK))
+QUESTIONS = DEFAULT_PACK.questions
+ROLES = DEFAULT_PACK.roles
+
+
+def main(argv=None):
+    """命令行入口：校验内容包并生成二进制缓存"""
+    parser = argparse.ArgumentParser(prog="python -m kpop_content", description="内容包工具")
+    commands = parser.add_subparsers(dest="command", required=True)
+    check = commands.add_parser("check", help="校验内容包（含翻译文件）并写入 .cache/")
+    check.add_argument("path", nargs="?", default=CONTENT_PATH, help="基础内容包 JSON 文件")
+    args = parser.parse_args(argv)
+
+    if args.command == "check":
+        try:
+            pack = load_pack(args.path)
+        except ContentError as e:
+            print(e, file=sys.stderr)
+            sys.exit(1)
+        print(
+            f"OK {args.path}: version {pack.version}, {pack.question_count} questions, "
+            f"{len(pack.roles)} roles, locales {', '.join(pack.locales)}"
+        )
+
@@ -0,0 +1,242 @@
+"""负载测试 - 用 streamlit.testing 的 AppTest 模拟 N 个用户走完整流程
+
+    python -m kpop_loadtest --users 50
+    python -m kpop_loadtest --users 10,50,200 --think-time 5 --tracemalloc
+
+每个模拟用户：打开欢迎页 → 开始 → 10题（随机选项）→ 结果页 → 重新开始。
+AppTest 会替换进程内的 Runtime，不能在多个线程里同时运行，所以 N 个用户在同一线程里
+按步轮流推进：N 个会话同时存活，共享同一进程的模块、缓存和内容包，
+内存状态与单个 worker 上的 N 个并发会话一致。Streamlit 的脚本执行受 GIL 限制，
+单个 worker 的 CPU 本来也是一次处理一个重跑，因此用每步耗时和用户思考时间估算并发上限。
+
+模拟用户完成的诊断默认不写入结果日志（kpop_results），也就不计入人群统计；
+需要连写入一起测时用 --result-log 指定一个单独的文件。
+
+测得的耗时包含 AppTest 自身解析元素树的开销，内存也包含 AppTest 为每个会话保存的元素树，
+两者都偏保守，适合横向对比（不同用户数、改动前后），不代表浏览器里的绝对值。
+
+AppTest 不支持片段（st.fragment）单独重跑：「次へ」/「前へ」在浏览器里只重跑问卷片段，
+在 AppTest 里却是整页重跑（set_page_config、load_css、页头每次都执行）。所以 next 一行是整页重跑的耗时；
+另外用 kpop_profiling 量出每步里问卷片段本身的耗时，报告为 next (fragment)，并分别给出两种算法的并发上限：
+整页重跑的偏保守，只算片段的偏乐观（不含 Streamlit 调度片段的开销），实际值在两者之间。
+"""
+import argparse
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+
+import kpop_profiling
+
+APP_PATH = Path(__file__).with_name("kpop_app_fixed.py")
+STEP_NAMES = ("load", "start", "next", "result", "restart")
+# 浏览器里只重跑片段的步骤，以及片段函数在 kpop_profiling 里的名称
+FRAGMENT_STEPS = ("next",)
+FRAGMENT_NAME = "render_question_flow"
+PERCENTILES = (50, 95, 99)
+
+
+def rss_bytes():
+    """当前进程的常驻内存（Linux 读 /proc，其他平台退回到峰值 RSS）"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class LoadStats:
+    """各步骤耗时、每个会话的重跑次数和出错信息"""
+
+    def __init__(self):
+        self.latencies = {name: [] for name in STEP_NAMES}
+        self.fragment = []  # FRAGMENT_STEPS 每步里问卷片段本身的耗时
+        self.session_reruns = []
+        self.errors = []
+
+    def record(self, step, seconds, fragment_seconds=None):
+        self.latencies[step].append(seconds)
+        if step in FRAGMENT_STEPS and fragment_seconds is not None:
+            self.fragment.append(fragment_seconds)
+
+    def step_table(self):
+        """[(步骤, 次数, p50, p95, p99, max)]，单位毫秒；片段耗时作为 "next (fragment)" 一行"""
+        rows = []
+        for name, samples in [(name, self.latencies[name]) for name in STEP_NAMES] + [("next (fragment)", self.fragment)]:
+            if not samples:
+                continue
+            ms = np.asarray(samples) * 1000
+            rows.append((name, len(ms), *np.percentile(ms, PERCENTILES), ms.max()))
+        return rows
+
+    @property
+    def steps(self):
+        return sum(len(samples) for samples in self.latencies.values())
+
+    @property
+    def mean_step(self):
+        """所有步骤的平均耗时（秒），每次点击都按整页重跑计"""
+        return sum(sum(samples) for samples in self.latencies.values()) / max(self.steps, 1)
+
+    @property
+    def mean_step_fragment(self):
+        """FRAGMENT_STEPS 只算片段本身时的平均耗时（秒）；没有量到片段耗时时返回 None"""
+        if not self.fragment:
+            return None
+        total = sum(sum(self.latencies[name]) for name in STEP_NAMES if name not in FRAGMENT_STEPS)
+        return (total + sum(self.fragment)) / max(self.steps, 1)
+
+
+def simulated_user(user_idx, stats, rng, locale=None, rounds=1, timeout=60):
+    """一个模拟用户；每完成一步 yield 一次，由调用方轮流推进"""
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(str(APP_PATH), default_timeout=timeout)
+    if locale:
+        at.query_params["lang"] = locale
+
+    def step(name, action):
+        fragment_start = kpop_profiling.totals().get(FRAGMENT_NAME, 0.0)
+        start = time.perf_counter()
+        action()
+        elapsed = time.perf_counter() - start
+        stats.record(name, elapsed, kpop_profiling.totals().get(FRAGMENT_NAME, 0.0) - fragment_start)
+        if at.exception:
+            raise RuntimeError(f"user {user_idx} step {name}: {at.exception[0].message}")
+
+    step("load", at.run)
+    yield
+    for _ in range(rounds):
+        step("start", lambda: at.button(key="welcome_start").click().run())
+        yield
+        while not (record := at.session_state["record"]).show_result:
+            at.radio[0].set_value(rng.randrange(len(at.radio[0].options)))
+            last = record.current_question == len(record.answers) - 1
+            button = "result_btn" if last else "next_btn"
+            step("result" if last else "next", lambda: at.button(key=button).click().run())
+            yield
+        stats.session_reruns.append(at.session_state["reruns"])
+        step("restart", lambda: at.button(key="restart_btn").click().run())
+        yield
+
+
+def run_load(users, seed=0, locales=(None,), rounds=1, trace_memory=False):
+    """N 个用户轮流推进直到全部完成，返回 (LoadStats, 内存摘要, 总耗时秒)"""
+    stats = LoadStats()
+    active = [
+        simulated_user(i, stats, random.Random(seed + i), locales[i % len(locales)], rounds)
+        for i in range(users)
+    ]
+
+    gc.collect()
+    memory = {"rss_start": rss_bytes(), "rss_peak": 0}
+    if trace_memory:
+        memory["traced_start"] = tracemalloc.get_traced_memory()[0]
+        memory["traced_peak"] = 0
+
+    started = time.perf_counter()
+    while active:
+        still_running = []
+        for user in active:
+            try:
+                next(user)
+                still_running.append(user)
+            except StopIteration:
+                pass
+            except RuntimeError as exc:
+                stats.errors.append(str(exc))
+        active = still_running
+        # 每轮采样一次：所有会话都还存活时的内存就是 N 个并发会话的峰值
+        memory["rss_peak"] = max(memory["rss_peak"], rss_bytes())
+        if trace_memory:
+            memory["traced_peak"] = max(memory["traced_peak"], tracemalloc.get_traced_memory()[0])
+    elapsed = time.perf_counter() - started
+
+    gc.collect()
+    memory["rss_end"] = rss_bytes()
+    if trace_memory:
+        memory["traced_end"] = tracemalloc.get_traced_memory()[0]
+    return stats, memory, elapsed
+
+
+def print_report(users, stats, memory, elapsed, think_time):
+    mib = 1024 * 1024
+    print(f"== {users} users: {stats.steps} steps in {elapsed:.1f}s "
+          f"({stats.steps / elapsed:.1f} reruns/s, {len(stats.session_reruns) / elapsed:.2f} sessions/s)")
+    print(f"{'step':<15} {'count':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for name, count, p50, p95, p99, worst in stats.step_table():
+        print(f"{name:<15} {count:>6} {p50:>8.1f} {p95:>8.1f} {p99:>8.1f} {worst:>8.1f}")
+    if stats.fragment:
+        print("note: AppTest reruns the whole script on fragment clicks; 'next' includes the page setup "
+              "(set_page_config, CSS, header) that the browser skips")
+
+    if stats.session_reruns:
+        reruns = np.asarray(stats.session_reruns)
+        print(f"reruns/session: mean {reruns.mean():.1f}, min {reruns.min()}, max {reruns.max()}")
+
+    growth = memory["rss_peak"] - memory["rss_start"]
+    print(f"rss: start {memory['rss_start'] / mib:.1f} MiB, peak {memory['rss_peak'] / mib:.1f} MiB "
+          f"(+{growth / users / 1024:.1f} KiB/live session), "
+          f"after finish {memory['rss_end'] / mib:.1f} MiB")
+    if "traced_start" in memory:
+        live = memory["traced_peak"] - memory["traced_start"]
+        retained = memory["traced_end"] - memory["traced_start"]
+        print(f"python heap: +{live / users / 1024:.1f} KiB/live session, "
+              f"{retained / 1024:.1f} KiB retained after all sessions finished")
+
+    # 单个 worker 一次只执行一个重跑：每个用户占用 step/(think+step) 的 CPU，占满时即为上限
+    if stats.steps:
+        ceiling = (think_time + stats.mean_step) / stats.mean_step
+        print(f"single-worker ceiling at {think_time:g}s think time: ~{ceiling:.0f} concurrent users "
+              f"(mean step {stats.mean_step * 1000:.1f} ms, every click a full rerun as in AppTest)")
+        fragment_step = stats.mean_step_fragment
+        if fragment_step:
+            ceiling = (think_time + fragment_step) / fragment_step
+            print(f"  with fragment-only next: ~{ceiling:.0f} concurrent users "
+                  f"(mean step {fragment_step * 1000:.1f} ms, excludes Streamlit's fragment overhead)")
+    for error in stats.errors:
+        print(f"error: {error}", file=sys.stderr)
+
+
+def main(argv=None):
+    """命令行入口"""
+    parser = argparse.ArgumentParser(prog="python -m kpop_loadtest", description="模拟多个用户走完整诊断流程")
+    parser.add_argument("--users", default="20", help="模拟用户数；逗号分隔可逐级加压，如 10,50,200")
+    parser.add_argument("--rounds", type=int, default=1, help="每个用户重复诊断的次数")
+    parser.add_argument("--locales", default="", help="用户轮流使用的语言，如 ja,en,ko（默认不指定）")
+    parser.add_argument("--think-time", type=float, default=5.0, help="估算并发上限时假设的用户思考时间（秒）")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--tracemalloc", action="store_true", help="同时统计 Python 堆内存（更准，但更慢）")
+    parser.add_argument("--result-log", default="", help="模拟结果写入的结果库（默认不写，避免混入真实日志）")
+    args = parser.parse_args(argv)
+
+    # AppTest 在本进程内执行应用，kpop_results 导入时读取这个变量：必须在第一次运行应用之前设置
+    os.environ["KPOP_RESULT_LOG"] = args.result_log
+    # 量问卷片段本身的耗时（只收集，不写报告文件）
+    kpop_profiling.enable()
+
+    levels = [int(users) for users in args.users.split(",")]
+    locales = tuple(args.locales.split(",")) if args.locales else (None,)
+
+    # 预热：导入、内容包、各语言的页面模板和样式表的一次性开销不计入各级测试
+    run_load(len(locales), seed=args.seed, locales=locales)
+    if args.tracemalloc:
+        tracemalloc.start()
+    try:
+        for users in levels:
+            stats, memory, elapsed = run_load(users, args.seed, locales, args.rounds, args.tracemalloc)
+            print_report(users, stats, memory, elapsed, args.think_time)
+    finally:
+        if args.tracemalloc:
+            tracemalloc.stop()
+
+
+if __name__ == "__main__":
+    main()
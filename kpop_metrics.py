@@ -0,0 +1,221 @@
+"""运行指标 - 以 Prometheus 文本格式导出
+
+    KPOP_METRICS_PORT=9108 streamlit run kpop_app_fixed.py          # http://localhost:9108/metrics
+    KPOP_METRICS_TEXTFILE=/var/lib/node_exporter/kpop.prom ...      # node_exporter textfile collector
+
+两个环境变量都没设置时只在进程内累计，不启动任何线程。
+"""
+import http.server
+import os
+import sys
+import threading
+import time
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+RERUN_COUNT_BUCKETS = (10, 15, 20, 25, 30, 40, 50, 75, 100)
+TEXTFILE_INTERVAL = 15  # 秒
+
+_lock = threading.Lock()
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+class Counter:
+    """带标签的计数器"""
+
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values = {}
+
+    def inc(self, *label_values, amount=1):
+        with _lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with _lock:
+            items = sorted(self._values.items())
+        for label_values, value in items:
+            labels = _format_labels(zip(self.label_names, label_values))
+            lines.append(f"{self.name}{labels} {value}")
+        return lines
+
+
+class Gauge:
+    """带标签的瞬时值"""
+
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values = {}
+
+    def set(self, value, *label_values):
+        with _lock:
+            self._values[label_values] = value
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge"]
+        with _lock:
+            items = sorted(self._values.items())
+        for label_values, value in items:
+            labels = _format_labels(list(zip(self.label_names, label_values)))
+            lines.append(f"{self.name}{labels} {value}")
+        return lines
+
+
+class Histogram:
+    """带标签的累积直方图（固定桶）"""
+
+    def __init__(self, name, help_text, buckets, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self.label_names = label_names
+        # 标签值 -> [各桶计数..., 总和, 总数]
+        self._values = {}
+
+    def observe(self, value, *label_values):
+        with _lock:
+            entry = self._values.get(label_values)
+            if entry is None:
+                entry = self._values[label_values] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[i] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with _lock:
+            items = sorted((key, list(entry)) for key, entry in self._values.items())
+        for label_values, entry in items:
+            labels = list(zip(self.label_names, label_values))
+            for bound, count in zip(self.buckets, entry):
+                lines.append(f"{self.name}_bucket{_format_labels(labels + [('le', bound)])} {count}")
+            lines.append(f"{self.name}_bucket{_format_labels(labels + [('le', '+Inf')])} {entry[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {entry[-2]}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {entry[-1]}")
+        return lines
+
+
+RERUN_SECONDS = Histogram(
+    "kpop_rerun_seconds", "Wall time of one script rerun, by page.", LATENCY_BUCKETS, ("page",)
+)
+SESSION_RERUNS = Histogram(
+    "kpop_session_reruns", "Script reruns needed to complete one test.", RERUN_COUNT_BUCKETS
+)
+RESULTS = Counter("kpop_results_total", "Completed tests, by result role.", ("role",))
+AI_REQUESTS = Counter(
+    "kpop_ai_requests_total",
+    "AI analysis requests, by outcome (cache, coalesced, backend, breaker_open, shed, disabled).",
+    ("outcome",),
+)
+AI_QUEUE = Gauge("kpop_ai_queue", "AI analysis calls waiting for or holding a worker.", ("state",))
+AI_WAIT_SECONDS = Histogram(
+    "kpop_ai_wait_seconds", "Time an AI analysis call waited for a free worker.", LATENCY_BUCKETS
+)
+AI_BREAKER_OPEN = Gauge("kpop_ai_breaker_open", "1 while the AI backend circuit breaker is open.")
+
+REGISTRY = [RERUN_SECONDS, SESSION_RERUNS, RESULTS, AI_REQUESTS, AI_QUEUE, AI_WAIT_SECONDS, AI_BREAKER_OPEN]
+
+
+def observe_rerun(page, seconds):
+    """记录一次重跑耗时；page 为 welcome / question_N / result"""
+    RERUN_SECONDS.observe(seconds, page)
+
+
+def observe_completion(role, reruns):
+    """记录一次完成的诊断：结果角色 + 本次会话的重跑次数"""
+    RESULTS.inc(role)
+    SESSION_RERUNS.observe(reruns)
+
+
+def observe_ai_request(outcome):
+    """记录一次AI分析请求的去向"""
+    AI_REQUESTS.inc(outcome)
+
+
+def observe_ai_queue(queued, running, wait_seconds=None):
+    """记录分发器的队列深度（等待中 / 执行中）；wait_seconds 为刚开始执行的调用的排队时间"""
+    AI_QUEUE.set(queued, "queued")
+    AI_QUEUE.set(running, "running")
+    if wait_seconds is not None:
+        AI_WAIT_SECONDS.observe(wait_seconds)
+
+
+def observe_ai_breaker(is_open):
+    AI_BREAKER_OPEN.set(int(is_open))
+
+
+def render():
+    """生成 Prometheus 文本格式"""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.collect())
+    return "\n".join(lines) + "\n"
+
+
+def write_textfile(path):
+    """原子写入 textfile collector 文件"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(render())
+    os.replace(tmp_path, path)
+
+
+class _MetricsHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _textfile_loop(path):
+    while True:
+        time.sleep(TEXTFILE_INTERVAL)
+        try:
+            write_textfile(path)
+        except OSError:
+            pass
+
+
+_exporter_started = False
+
+
+def start_exporter():
+    """按环境变量启动导出（每个进程只启动一次）"""
+    global _exporter_started
+    with _lock:
+        if _exporter_started:
+            return
+        _exporter_started = True
+
+    port = os.environ.get("KPOP_METRICS_PORT")
+    if port:
+        try:
+            server = http.server.ThreadingHTTPServer(("127.0.0.1", int(port)), _MetricsHandler)
+        except OSError as e:
+            print(f"kpop_metrics: 无法监听端口 {port}: {e}", file=sys.stderr)
+        else:
+            threading.Thread(target=server.serve_forever, name="kpop-metrics-http", daemon=True).start()
+
+    textfile = os.environ.get("KPOP_METRICS_TEXTFILE")
+    if textfile:
+        threading.Thread(target=_textfile_loop, args=(textfile,), name="kpop-metrics-textfile", daemon=True).start()
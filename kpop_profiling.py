@@ -0,0 +1,151 @@
+"""启动 / 重跑耗时分析
+
+开启方式（二选一）：
+
+    KPOP_PROFILE=1 streamlit run kpop_app_fixed.py
+    streamlit run kpop_app_fixed.py -- --profile
+
+重跑结束后把汇总报告写到 KPOP_PROFILE_REPORT（默认 kpop_profile.txt），最多每 DUMP_INTERVAL 秒一次，
+进程退出时再写一次。写入先写临时文件再原子替换，多个会话同时重跑也不会写坏报告。未开启时 timed / profiled 不产生任何开销。
+"""
+import atexit
+import functools
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+ENABLED = os.environ.get("KPOP_PROFILE", "") not in ("", "0") or "--profile" in sys.argv
+REPORT_PATH = os.environ.get("KPOP_PROFILE_REPORT", "kpop_profile.txt")
+DUMP_INTERVAL = 1.0  # 秒
+
+_lock = threading.Lock()
+_dump_lock = threading.Lock()
+_last_dump = 0.0
+# 名称 -> [次数, 总耗时, 最短, 最长]（秒）
+_stats = {}
+
+
+def record(name, seconds):
+    """记录一次耗时"""
+    with _lock:
+        entry = _stats.get(name)
+        if entry is None:
+            _stats[name] = [1, seconds, seconds, seconds]
+        else:
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] = min(entry[2], seconds)
+            entry[3] = max(entry[3], seconds)
+
+
+def record_once(name, seconds):
+    """只记录进程里的第一次（如模块导入：之后的重跑导入的都是已缓存的模块，不代表导入耗时）"""
+    with _lock:
+        if name in _stats:
+            return
+        _stats[name] = [1, seconds, seconds, seconds]
+
+
+@contextmanager
+def timed(name):
+    """计时代码块"""
+    if not ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+
+def profiled(name=None):
+    """计时函数的装饰器；未开启分析时原样返回函数"""
+    def decorator(func):
+        if not ENABLED:
+            return func
+        label = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(label, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def enable(report_path=None):
+    """在进程内开启计时（离线工具用，如 kpop_loadtest）；report_path 为 None 时只收集，不写报告文件
+
+    之后定义的 profiled 函数才会计时：Streamlit 每次重跑都重新执行页面脚本，所以对应用立即生效。
+    已经用 KPOP_PROFILE 开启时不做任何改变。
+    """
+    global ENABLED, REPORT_PATH
+    if ENABLED:
+        return
+    ENABLED = True
+    REPORT_PATH = report_path
+
+
+def totals():
+    """各名称目前为止的累计耗时（秒）：{名称: 总耗时}"""
+    with _lock:
+        return {name: entry[1] for name, entry in _stats.items()}
+
+
+def report():
+    """生成汇总报告（按总耗时降序，单位毫秒）"""
+    with _lock:
+        rows = sorted(_stats.items(), key=lambda item: item[1][1], reverse=True)
+    lines = [f"{'name':<28}{'count':>8}{'total':>12}{'mean':>10}{'min':>10}{'max':>10}"]
+    for name, (count, total, low, high) in rows:
+        lines.append(
+            f"{name:<28}{count:>8}{total * 1e3:>12.2f}{total / count * 1e3:>10.3f}"
+            f"{low * 1e3:>10.3f}{high * 1e3:>10.3f}"
+        )
+    return "\n".join(lines) + "\n"
+
+
+def dump(path=None):
+    """把汇总报告原子写入文件（先写临时文件再替换）"""
+    global _last_dump
+    if not ENABLED:
+        return
+    path = path or REPORT_PATH
+    if not path:
+        return
+    with _dump_lock:
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(report())
+        os.replace(tmp_path, path)
+        _last_dump = time.monotonic()
+
+
+def dump_throttled():
+    """重跑结束时调用：距上次写入不到 DUMP_INTERVAL 秒时跳过，避免每次重跑都写文件
+
+    写不进去（路径不存在、没有权限）时报告到 stderr，不影响页面；同样最多每 DUMP_INTERVAL 秒一次。
+    """
+    global _last_dump
+    if ENABLED and time.monotonic() - _last_dump >= DUMP_INTERVAL:
+        try:
+            dump()
+        except OSError as e:
+            _last_dump = time.monotonic()
+            print(f"kpop_profiling: 无法写入报告 {REPORT_PATH}: {e}", file=sys.stderr)
+
+
+def reset():
+    """清空已记录的数据"""
+    with _lock:
+        _stats.clear()
+
+
+if ENABLED:
+    atexit.register(dump)
@@ -0,0 +1,258 @@
+"""诊断结果日志 - 每次完成的诊断追加写入 SQLite（WAL 模式）
+
+页面线程只把一行数据放进队列，由后台线程批量写入，不等待磁盘。
+进程退出时写完队列里剩下的数据。
+
+    KPOP_RESULT_LOG=/var/lib/kpop/results.sqlite3 streamlit run kpop_app_fixed.py
+    python -m kpop_results summary                     # 各角色的完成数
+    python -m kpop_results bench --count 100000        # 写入吞吐量
+
+默认写在应用目录下（与启动时的工作目录无关），KPOP_RESULT_LOG 设为空字符串时不记录。不导入 Streamlit。
+"""
+import argparse
+import atexit
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+
+import kpop_content
+
+DEFAULT_LOG_PATH = os.path.join(kpop_content.APP_DIR, "kpop_results.sqlite3")
+LOG_PATH = os.environ.get("KPOP_RESULT_LOG", DEFAULT_LOG_PATH)
+BATCH_SIZE = 1000
+FLUSH_INTERVAL = 0.5  # 秒，队列不满一批时最多等这么久
+MAX_PENDING = 100_000  # 队列上限；磁盘卡住时丢弃新结果而不是占满内存
+
+SCORE_COLUMNS = tuple(f"score_{role}" for role in kpop_content.ROLE_KEYS)
+COLUMNS = ("finished_at", "started_at", "version", "locale", "answers", "answered", *SCORE_COLUMNS, "role", "co_role")
+# 每题都作答了的结果（自适应模式提前结束的得分只覆盖部分题目）
+COMPLETE = "answered = length(answers)"
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY,
+    finished_at REAL NOT NULL,
+    started_at REAL,
+    version TEXT NOT NULL,
+    locale TEXT NOT NULL,
+    answers BLOB NOT NULL,
+    answered INTEGER,
+    {", ".join(f"{column} INTEGER NOT NULL" for column in SCORE_COLUMNS)},
+    role TEXT NOT NULL,
+    co_role TEXT
+)
+"""
+_INSERT = f"INSERT INTO results ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+
+
+def connect(path=LOG_PATH):
+    """打开结果库（不存在时创建），WAL 模式：写入不阻塞其他进程读取"""
+    connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.execute(_SCHEMA)
+    _migrate(connection)
+    connection.commit()
+    return connection
+
+
+def _migrate(connection):
+    """旧版结果库没有 answered 列：加上并按答卷里未作答（0xFF）的题数补齐"""
+    if any(row[1] == "answered" for row in connection.execute("PRAGMA table_info(results)")):
+        return
+    connection.execute("ALTER TABLE results ADD COLUMN answered INTEGER")
+    connection.executemany(
+        "UPDATE results SET answered = ? WHERE id = ?",
+        ((len(answers) - answers.count(0xFF), row_id) for row_id, answers in
+         connection.execute("SELECT id, answers FROM results").fetchall()),
+    )
+
+
+def completion_row(record, finished_at=None):
+    """把一个完成的 kpop_session.SessionRecord 转成一行（按 COLUMNS 排列）"""
+    role, co_role = record.result
+    return (
+        time.time() if finished_at is None else finished_at,
+        record.started_at,
+        record.version,
+        record.locale,
+        bytes(record.answers),
+        record.answered,
+        *(int(score) for score in record.scores),
+        role,
+        co_role,
+    )
+
+
+class ResultLog:
+    """后台线程批量写入的追加日志"""
+
+    def __init__(self, path=LOG_PATH, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL, max_pending=MAX_PENDING):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self.written = 0
+        self._queue = queue.Queue(max_pending)
+        self._closed = False
+        # 在调用线程里建库，路径或权限有问题时立即报错
+        connect(path).close()
+        self._thread = threading.Thread(target=self._write_loop, name="kpop-result-log", daemon=True)
+        self._thread.start()
+
+    def append(self, row):
+        """放进写入队列，不等待磁盘；队列已满时丢弃并计数"""
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self):
+        """等待目前为止放进队列的结果全部写入"""
+        self._queue.join()
+
+    def close(self):
+        """写完剩下的结果并停止后台线程"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+
+    def _write_loop(self):
+        connection = connect(self.path)
+        try:
+            while True:
+                rows = [self._queue.get()]
+                deadline = time.monotonic() + self.flush_interval
+                while len(rows) < self.batch_size and rows[-1] is not None:
+                    try:
+                        rows.append(self._queue.get(timeout=max(deadline - time.monotonic(), 0)))
+                    except queue.Empty:
+                        break
+                stop = rows[-1] is None
+                batch = rows[:-1] if stop else rows
+                try:
+                    with connection:
+                        connection.executemany(_INSERT, batch)
+                    self.written += len(batch)
+                except sqlite3.Error as e:
+                    self.dropped += len(batch)
+                    print(f"kpop_results: 写入失败，丢弃 {len(batch)} 条: {e}", file=sys.stderr)
+                finally:
+                    for _ in rows:
+                        self._queue.task_done()
+                if stop:
+                    return
+        finally:
+            connection.close()
+
+
+def iter_results(path=LOG_PATH, columns=COLUMNS, since_id=0, until_id=None, complete_only=False):
+    """按写入顺序读取 since_id < id <= until_id 的结果（只读连接，可以和写入进程同时使用）
+
+    complete_only 时跳过自适应模式提前结束的结果。
+    """
+    connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    where = f" AND {COMPLETE}" if complete_only else ""
+    try:
+        yield from connection.execute(
+            f"SELECT {', '.join(columns)} FROM results WHERE id > ? AND id <= ?{where} ORDER BY id",
+            (since_id, sys.maxsize if until_id is None else until_id),
+        )
+    finally:
+        connection.close()
+
+
+def last_id(path=LOG_PATH):
+    """最后一条结果的 id；日志不存在或为空时返回 0"""
+    try:
+        connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    except sqlite3.OperationalError:
+        return 0
+    try:
+        return connection.execute("SELECT COALESCE(MAX(id), 0) FROM results").fetchone()[0]
+    except sqlite3.OperationalError:
+        return 0
+    finally:
+        connection.close()
+
+
+_log = None
+_log_lock = threading.Lock()
+
+
+def start_writer(path=LOG_PATH):
+    """启动写入线程（每个进程只启动一次），进程退出时写完剩下的结果；返回 ResultLog，未启用时返回 None"""
+    global _log
+    with _log_lock:
+        if _log is None and path:
+            try:
+                _log = ResultLog(path)
+            except sqlite3.Error as e:
+                print(f"kpop_results: 无法打开 {path}，不记录结果: {e}", file=sys.stderr)
+                return None
+            atexit.register(_log.close)
+        return _log
+
+
+def log_completion(record):
+    """记录一次完成的诊断（不阻塞）"""
+    if _log is not None:
+        _log.append(completion_row(record))
+
+
+def main(argv=None):
+    """命令行入口"""
+    parser = argparse.ArgumentParser(prog="python -m kpop_results", description="诊断结果日志工具")
+    parser.add_argument("--path", default=LOG_PATH or DEFAULT_LOG_PATH, help="结果库路径")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("summary", help="各角色的完成数")
+    bench = commands.add_parser("bench", help="测量写入吞吐量（写到临时文件）")
+    bench.add_argument("--count", type=int, default=100_000, help="写入的结果数")
+    args = parser.parse_args(argv)
+
+    if args.command == "summary":
+        counts = {}
+        total = early = 0
+        for role, complete in iter_results(args.path, columns=("role", COMPLETE)):
+            counts[role] = counts.get(role, 0) + 1
+            total += 1
+            early += not complete
+        print(f"{args.path}: {total} results ({early} ended early)")
+        for role in kpop_content.ROLE_KEYS:
+            print(f"{role:<12} {counts.get(role, 0):>10}")
+
+    elif args.command == "bench":
+        import random
+        import tempfile
+
+        import kpop_session
+
+        rng = random.Random(0)
+        pack = kpop_content.DEFAULT_PACK
+        rows = []
+        for _ in range(min(args.count, 1000)):
+            record = kpop_session.SessionRecord(cursor=pack.question_count)
+            for q, count in enumerate(pack.option_counts):
+                record.answer(q, rng.randrange(count))
+            rows.append(completion_row(record))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            log = ResultLog(os.path.join(tmp, "bench.sqlite3"), max_pending=args.count)
+            started = time.perf_counter()
+            for i in range(args.count):
+                log.append(rows[i % len(rows)])
+            enqueued = time.perf_counter() - started
+            log.close()
+            elapsed = time.perf_counter() - started
+        print(f"results:    {args.count}")
+        print(f"append:     {enqueued / args.count * 1e6:8.2f} µs/result (page thread)")
+        print(f"written:    {log.written / elapsed:8.0f} results/s ({log.dropped} dropped)")
+
+
+if __name__ == "__main__":
+    main()
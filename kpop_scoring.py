@@ -0,0 +1,634 @@
+"""诊断评分引擎 - 使用内容包里预编译好的 (问题 × 选项 × 角色) 权重张量
+
+pack 参数缺省时使用导入时加载的内容包（kpop_content.DEFAULT_PACK），
+应用内的会话按自己的内容包打分。
+
+也可以不启动 Streamlit 直接批量重算历史答卷：
+
+    python -m kpop_scoring score answers.csv > scored.csv
+    python -m kpop_scoring score answers.jsonl --chunk-size 50000 -o scored.csv
+
+未作答的题写 255（UNANSWERED，与结果日志的答卷一致），不计分。
+
+预先枚举全部可达得分向量（部署前构建，结果页直接查表）：
+
+    python -m kpop_scoring build-table
+
+同分处理策略（KPOP_TIE_BREAK，默认 first）的平局频率与耗时基准：
+
+    python -m kpop_scoring bench-ties
+
+自适应模式（KPOP_ADAPTIVE=1）：结果角色已经确定时提前结束，以及在全部答卷上平均能省下几题：
+
+    python -m kpop_scoring adaptive-report
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import threading
+import time
+from itertools import islice
+
+import numpy as np
+
+from kpop_content import DEFAULT_PACK, ROLE_INDEX, ROLE_KEYS, TAG_KEYS, compile_questions  # noqa: F401（对外再导出）
+from kpop_content import PACK_HISTORY
+
+# 导入时内容包的权重张量（离线工具使用）
+WEIGHTS = DEFAULT_PACK.weights
+OPTION_COUNTS = DEFAULT_PACK.option_counts
+
+RESULT_TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "result_table.npz")
+
+# 按内容版本（或权重指纹）缓存的派生数据，和 kpop_content 一样只保留最近 PACK_HISTORY 个；
+# 被淘汰的版本如果还有会话在用，下次用到时重新计算
+_derived_lock = threading.Lock()
+
+
+def _remember(cache, key, value):
+    """写入派生数据缓存，超过 PACK_HISTORY 个时淘汰最早写入的"""
+    with _derived_lock:
+        cache[key] = value
+        while len(cache) > PACK_HISTORY:
+            del cache[next(iter(cache))]
+    return value
+
+
+# 内容版本 -> (得分上限, 混合进制的各位权)
+_score_radix_cache = {}
+
+
+def _score_radix(pack):
+    """得分向量 → 单个整数键的混合进制：每个角色的上限 = 各题最大权重之和 + 1"""
+    radix = _score_radix_cache.get(pack.version)
+    if radix is None:
+        limits = pack.weights.max(axis=1).sum(axis=0).astype(np.int64) + 1
+        radix = _remember(_score_radix_cache, pack.version, (limits, np.concatenate(([1], np.cumprod(limits)[:-1]))))
+    return radix
+
+
+def score_answers(answers, pack=None):
+    """按选项序号打分：一次 gather + sum
+
+    answers 可以是一份答卷 (题数,) 或多份答卷 (N, 题数)，
+    只答了前几题时按已答部分计算。返回值的最后一维按 ROLE_KEYS 排列。
+    """
+    weights = (pack or DEFAULT_PACK).weights
+    answers = np.asarray(answers, dtype=np.intp)
+    questions = np.arange(answers.shape[-1])
+    return weights[questions, answers].sum(axis=-2, dtype=np.int32)
+
+
+# 答卷存储：每题一个字节的选项序号，UNANSWERED 表示还没作答
+UNANSWERED = 0xFF
+
+
+def new_answer_store(pack=None):
+    """创建空答卷（长度 = 题数的 bytearray）"""
+    return bytearray([UNANSWERED]) * (pack or DEFAULT_PACK).question_count
+
+
+def score_answer_store(store, pack=None):
+    """按答卷存储打分，未作答的题目不计分"""
+    weights = (pack or DEFAULT_PACK).weights
+    answers = np.frombuffer(bytes(store), dtype=np.uint8)
+    answered = answers != UNANSWERED
+    return weights[np.flatnonzero(answered), answers[answered]].sum(axis=0, dtype=np.int32)
+
+
+def score_profile(store, pack=None):
+    """按答卷存储同时计算角色得分和标签计数（一次 gather + sum，使用内容包的 option_table）
+
+    返回 (得分向量（按 ROLE_KEYS 排列）, 标签计数（按 TAG_KEYS 排列）)，未作答的题目不计。
+    """
+    table = (pack or DEFAULT_PACK).option_table
+    answers = np.frombuffer(bytes(store), dtype=np.uint8)
+    answered = answers != UNANSWERED
+    totals = table[np.flatnonzero(answered), answers[answered]].sum(axis=0, dtype=np.int32)
+    return totals[:len(ROLE_KEYS)], totals[len(ROLE_KEYS):]
+
+
+def option_tags(question_idx, option_idx, pack=None):
+    """某个选项的标签（从位掩码还原）"""
+    mask = int((pack or DEFAULT_PACK).tag_masks[question_idx, option_idx])
+    return tuple(tag for i, tag in enumerate(TAG_KEYS) if mask >> i & 1)
+
+
+def tags_to_dict(tag_counts):
+    """把标签计数向量还原成 {标签: 次数} 字典"""
+    return dict(zip(TAG_KEYS, np.asarray(tag_counts).tolist()))
+
+
+def result_role(scores):
+    """取最高分角色（argmax），同分时按 ROLE_KEYS 顺序取第一个"""
+    return ROLE_KEYS[int(np.argmax(scores))]
+
+
+def scores_to_dict(scores):
+    """把分数向量还原成 {角色: 分数} 字典，供图表和展示使用"""
+    return dict(zip(ROLE_KEYS, np.asarray(scores).tolist()))
+
+
+def scores_from_dict(scores):
+    """把 {角色: 分数} 字典转换成按 ROLE_KEYS 排列的分数向量"""
+    return np.array([scores[role] for role in ROLE_KEYS], dtype=np.int32)
+
+
+def weights_digest(pack=None):
+    """权重张量的指纹，用来判断预计算的结果表是否过期"""
+    return (pack or DEFAULT_PACK).weights_digest
+
+
+def encode_scores(scores, pack=None):
+    """把得分向量（或 (N, 6) 矩阵）编码成整数键；相加关系保持不变"""
+    _, radix = _score_radix(pack or DEFAULT_PACK)
+    return np.asarray(scores, dtype=np.int64) @ radix
+
+
+def decode_scores(keys, pack=None):
+    """整数键还原成 (N, 6) 得分矩阵"""
+    limits, radix = _score_radix(pack or DEFAULT_PACK)
+    keys = np.asarray(keys, dtype=np.int64)
+    return (keys[..., None] // radix) % limits
+
+
+def enumerate_score_space(pack=None):
+    """动态规划枚举全部可达得分向量
+
+    逐题把「当前可达的得分键 × 本题各选项的权重键」展开再去重合并，
+    不需要遍历 5^10 种答卷。返回 (升序的得分键, 每个得分向量对应的答卷组合数)。
+    """
+    pack = pack or DEFAULT_PACK
+    keys = np.zeros(1, dtype=np.int64)
+    counts = np.ones(1, dtype=np.int64)
+    for q in range(pack.question_count):
+        option_keys = encode_scores(pack.weights[q, :pack.option_counts[q]], pack)
+        expanded = (keys[:, None] + option_keys[None, :]).ravel()
+        keys, inverse = np.unique(expanded, return_inverse=True)
+        merged = np.zeros(len(keys), dtype=np.int64)
+        np.add.at(merged, inverse.ravel(), np.repeat(counts, len(option_keys)))
+        counts = merged
+    return keys, counts
+
+
+def build_result_table(path=RESULT_TABLE_PATH, pack=None):
+    """枚举得分空间，记录每个得分向量的诊断结果并保存；返回 (keys, counts, roles)"""
+    pack = pack or DEFAULT_PACK
+    keys, counts = enumerate_score_space(pack)
+    roles = np.argmax(decode_scores(keys, pack), axis=1).astype(np.uint8)
+    np.savez_compressed(path, digest=np.array(pack.weights_digest), keys=keys, counts=counts, roles=roles)
+    return keys, counts, roles
+
+
+def load_result_table(path=RESULT_TABLE_PATH, pack=None):
+    """读取结果表；文件不存在或权重已经变化时返回 None"""
+    try:
+        with np.load(path) as table:
+            if str(table['digest']) != weights_digest(pack):
+                return None
+            return table['keys'], table['roles']
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+# 权重指纹 -> 结果表（没有可用结果表时为空元组）
+_result_tables = {}
+
+
+def lookup_role(scores, pack=None):
+    """查预计算的结果表得到诊断结果；没有结果表（或已过期）时退回 argmax"""
+    pack = pack or DEFAULT_PACK
+    table = _result_tables.get(pack.weights_digest)
+    if table is None:
+        table = _remember(_result_tables, pack.weights_digest, load_result_table(pack=pack) or ())
+    if table:
+        keys, roles = table
+        key = encode_scores(scores, pack)
+        i = np.searchsorted(keys, key)
+        if i < len(keys) and keys[i] == key:
+            return ROLE_KEYS[roles[i]]
+    return result_role(scores)
+
+
+# 同分处理策略：
+#   first   - 按 ROLE_KEYS 顺序取第一个（原来的行为）
+#   tags    - 比较标签计数与各角色标签亲和度的内积（kpop_content 的 option_table 推导）
+#   recency - 从最后一题往前比较，取较近题目里得分更高的角色
+#   dual    - 结果按 first 取，同时报告并列的第二个角色（双重类型）
+TIE_BREAK_POLICIES = ("first", "tags", "recency", "dual")
+TIE_BREAK = os.environ.get("KPOP_TIE_BREAK", "first")
+if TIE_BREAK not in TIE_BREAK_POLICIES:
+    TIE_BREAK = "first"
+
+# 内容版本 -> 角色 × 标签的亲和度矩阵
+_affinity_cache = {}
+
+
+def role_tag_affinity(pack=None):
+    """各角色与各标签的亲和度 (角色数, 标签数)：带该标签的选项给这个角色的权重之和"""
+    pack = pack or DEFAULT_PACK
+    affinity = _affinity_cache.get(pack.version)
+    if affinity is None:
+        n_roles = len(ROLE_KEYS)
+        weights = pack.option_table[..., :n_roles].reshape(-1, n_roles).astype(np.int64)
+        tag_bits = pack.option_table[..., n_roles:].reshape(-1, len(TAG_KEYS)).astype(np.int64)
+        affinity = _remember(_affinity_cache, pack.version, weights.T @ tag_bits)
+    return affinity
+
+
+def _recency_keys(answers, pack):
+    """(N, 题数) 答卷 → (N, 角色数) 的近因键：按题目把得分贡献排成混合进制数，越靠后的题位权越高
+
+    两个角色的键比较大小 = 从最后一题往前逐题比较得分贡献。键超出 int64 时只取最近的若干题。
+    UNANSWERED 的题没有得分贡献（自适应模式跳过的正是最后几题，不能按某个选项计入）。
+    """
+    weights = pack.weights
+    base = int(weights.max()) + 1
+    depth = min(weights.shape[0], int(62 // np.log2(base)) if base > 1 else weights.shape[0])
+    answers = np.asarray(answers, dtype=np.intp)[..., -depth:]
+    answered = answers != UNANSWERED
+    questions = np.arange(weights.shape[0])[-depth:]
+    contributions = weights[questions, np.where(answered, answers, 0)].astype(np.int64) * answered[..., None]
+    place = base ** np.arange(depth, dtype=np.int64)
+    return np.einsum("...qr,q->...r", contributions, place)
+
+
+def tie_keys(policy, scores, tags=None, answers=None, pack=None):
+    """同分时的第二排序键 (..., 角色数)；first / dual 策略没有第二排序键，返回 None"""
+    pack = pack or DEFAULT_PACK
+    if policy == "tags":
+        return np.asarray(tags, dtype=np.int64) @ role_tag_affinity(pack).T
+    if policy == "recency":
+        return _recency_keys(answers, pack)
+    return None
+
+
+def break_ties(scores, tags=None, answers=None, policy=None, pack=None):
+    """按同分处理策略得到 (结果角色序号, 并列角色序号)；一次遍历固定顺序的得分数组
+
+    scores 可以是 (角色数,) 或 (N, 角色数)。并列角色序号只有 dual 策略且确实同分时才有，否则为 -1。
+    tags / answers 分别是 tags / recency 策略需要的标签计数和选项序号（可以含 UNANSWERED）。
+    """
+    policy = policy or TIE_BREAK
+    scores = np.asarray(scores)
+    tied = scores == scores.max(axis=-1, keepdims=True)
+    keys = tie_keys(policy, scores, tags, answers, pack)
+    if keys is None:
+        primary = np.argmax(tied, axis=-1)
+    else:
+        primary = np.argmax(np.where(tied, keys, -1), axis=-1)
+
+    co_role = np.full(primary.shape, -1, dtype=np.intp)
+    if policy == "dual":
+        others = tied & (np.arange(len(ROLE_KEYS)) != primary[..., None])
+        co_role = np.where(others.any(axis=-1), np.argmax(others, axis=-1), -1)
+    return primary, co_role
+
+
+def resolve_result(store, policy=None, pack=None):
+    """按答卷存储得到诊断结果 (结果角色, 并列角色或 None)
+
+    没有同分时直接查结果表；同分时按 policy（默认 KPOP_TIE_BREAK）处理。
+    """
+    pack = pack or DEFAULT_PACK
+    scores, tags = score_profile(store, pack)
+    if np.count_nonzero(scores == scores.max()) == 1:
+        return lookup_role(scores, pack), None
+    answers = np.frombuffer(bytes(store), dtype=np.uint8)
+    primary, co_role = break_ties(scores, tags, answers, policy, pack)
+    return ROLE_KEYS[int(primary)], (ROLE_KEYS[int(co_role)] if co_role >= 0 else None)
+
+
+ADAPTIVE = os.environ.get("KPOP_ADAPTIVE", "") not in ("", "0")
+
+# 内容版本 -> 各题之后的最大追赶分（见 lock_margins）
+_lock_margin_cache = {}
+
+
+def lock_margins(pack=None):
+    """margins[k, L, r] = 从第 k 题（含）到最后一题，角色 r 最多能比角色 L 多拿的分
+
+    各题独立取 max(选项里 r 的权重 - L 的权重) 再求后缀和；只看实际存在的选项。
+    形状 (题数 + 1, 角色数, 角色数)，margins[题数] 全为 0。
+    """
+    pack = pack or DEFAULT_PACK
+    margins = _lock_margin_cache.get(pack.version)
+    if margins is None:
+        weights = pack.weights.astype(np.int32)
+        # diff[q, o, L, r] = 选项 o 上 r 比 L 多得的分；不存在的选项不参与取最大
+        diff = weights[:, :, None, :] - weights[:, :, :, None]
+        exists = np.arange(weights.shape[1]) < np.asarray(pack.option_counts)[:, None]
+        per_question = np.where(exists[:, :, None, None], diff, np.iinfo(np.int32).min).max(axis=1)
+        margins = np.zeros((pack.question_count + 1,) + per_question.shape[1:], dtype=np.int32)
+        margins[:-1] = per_question[::-1].cumsum(axis=0)[::-1]
+        margins.setflags(write=False)
+        _remember(_lock_margin_cache, pack.version, margins)
+    return margins
+
+
+def locked_leaders(scores, answered, policy=None, pack=None):
+    """已答前 answered 题、得分为 scores 时，剩下的题怎么选（或不再作答）结果角色都不会变 → 该角色序号
+
+    scores 可以是 (角色数,) 或 (N, 角色数)；结果还没确定的返回 -1。
+    领先角色必须在每个对手剩余的最大追赶分（不小于0）之上严格领先；
+    只有 first 策略下，排在领先角色之后的对手最多追平也算确定（同分时本来就判给前面的角色）。
+    """
+    policy = policy or TIE_BREAK
+    scores = np.asarray(scores, dtype=np.int32)
+    leader = np.argmax(scores, axis=-1)
+    gap = np.take_along_axis(scores, leader[..., None], axis=-1) - scores
+    reach = np.maximum(lock_margins(pack)[answered][leader], 0)
+    safe = gap > reach
+    if policy == "first":
+        safe |= (gap == reach) & (np.arange(len(ROLE_KEYS)) > leader[..., None])
+    safe |= np.arange(len(ROLE_KEYS)) == leader[..., None]
+    return np.where(safe.all(axis=-1), leader, -1)
+
+
+def locked_role(store, answered, policy=None, pack=None):
+    """按答卷存储的前 answered 题判断结果是否已确定：返回结果角色，未确定返回 None"""
+    prefix = bytearray(store[:answered]) + bytes([UNANSWERED]) * (len(store) - answered)
+    leader = int(locked_leaders(score_answer_store(prefix, pack), answered, policy, pack))
+    return ROLE_KEYS[leader] if leader >= 0 else None
+
+
+def role_distribution(counts, roles):
+    """按答卷组合数统计各角色被判定的次数 → {角色: (答卷数, 得分向量数)}"""
+    answer_counts = np.bincount(roles, weights=counts, minlength=len(ROLE_KEYS)).astype(np.int64)
+    vector_counts = np.bincount(roles, minlength=len(ROLE_KEYS))
+    return {role: (int(answer_counts[i]), int(vector_counts[i])) for i, role in enumerate(ROLE_KEYS)}
+
+
+def score_batch(answers_matrix):
+    """批量打分：(N, 题数) 的选项序号矩阵 → (分数矩阵 (N, 6), 结果角色序号 (N,))
+
+    与 calculate_scores / get_result 的逻辑完全一致（同分按 KPOP_TIE_BREAK 处理），角色序号对应 ROLE_KEYS。
+    UNANSWERED（自适应模式提前结束时跳过的题）不计分，和结果日志里的答卷一样。
+    """
+    answers_matrix = np.asarray(answers_matrix, dtype=np.intp)
+    if answers_matrix.ndim != 2 or answers_matrix.shape[1] != len(OPTION_COUNTS):
+        raise ValueError(f"答卷矩阵的形状应为 (N, {len(OPTION_COUNTS)})，实际为 {answers_matrix.shape}")
+    answered = answers_matrix != UNANSWERED
+    invalid = answered & ((answers_matrix < 0) | (answers_matrix >= OPTION_COUNTS))
+    if invalid.any():
+        row, col = np.argwhere(invalid)[0]
+        raise ValueError(f"第 {row + 1} 份答卷的第 {col + 1} 题选项序号越界: {answers_matrix[row, col]}")
+    options = np.where(answered, answers_matrix, 0)
+    gathered = DEFAULT_PACK.option_table[np.arange(answers_matrix.shape[1]), options]
+    totals = (gathered * answered[..., None]).sum(axis=1, dtype=np.int32)
+    scores, tags = totals[:, :len(ROLE_KEYS)], totals[:, len(ROLE_KEYS):]
+    roles, _ = break_ties(scores, tags, answers_matrix)
+    return scores, roles.astype(np.uint8)
+
+
+def _check_answers(answers):
+    """检查一份答卷：题数和每题的选项序号都要有效（UNANSWERED 表示未作答）；有问题时返回错误信息，否则返回 None"""
+    if len(answers) != len(OPTION_COUNTS):
+        return f"应有 {len(OPTION_COUNTS)} 题，实际为 {len(answers)} 题"
+    for q, (option_idx, count) in enumerate(zip(answers, OPTION_COUNTS)):
+        if type(option_idx) is int and option_idx == UNANSWERED:
+            continue
+        if not isinstance(option_idx, int) or isinstance(option_idx, bool) or not 0 <= option_idx < count:
+            return f"第 {q + 1} 题选项序号无效: {option_idx!r}"
+    return None
+
+
+def _read_csv_rows(f):
+    """逐行读取 CSV 答卷 → (行号, id, 选项序号列表或错误信息)
+
+    最后 题数 列是选项序号；前面还有列时，第一列作为 id 原样输出。只有第一行可以是表头，
+    之后的无效行不会跳过，而是带着行号报告出来，输出与输入逐行对应。
+    """
+    n_questions = len(OPTION_COUNTS)
+    reader = csv.reader(f)
+    first = True
+    for row in reader:
+        if not row:
+            continue
+        row_id = row[0] if len(row) > n_questions else ""
+        try:
+            answers = [int(value) for value in row[-n_questions:]]
+        except ValueError:
+            if first:
+                first = False
+                continue  # 表头
+            yield reader.line_num, row_id, f"选项序号不是整数: {row[-n_questions:]}"
+            continue
+        first = False
+        yield reader.line_num, row_id, _check_answers(answers) or answers
+
+
+def _read_jsonl_rows(f):
+    """逐行读取 JSONL 答卷 → (行号, id, 选项序号列表或错误信息)
+
+    每行是选项序号列表，或带 "answers" 字段（可选 "id" 字段）的对象。
+    """
+    for line_no, line in enumerate(f, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield line_no, "", f"JSON 解析失败: {e}"
+            continue
+        row_id = ""
+        if isinstance(record, dict):
+            row_id = record.get("id", "")
+            record = record.get("answers")
+        if not isinstance(record, list):
+            yield line_no, row_id, "缺少选项序号列表"
+            continue
+        yield line_no, row_id, _check_answers(record) or record
+
+
+def iter_scored_chunks(rows, chunk_size=10000):
+    """把 (行号, id, 答卷或错误信息) 流按块打分，内存占用只与 chunk_size 有关
+
+    逐块产出与输入同序的 [(行号, id, 得分列表或 None, 结果角色或 None, 错误信息或 None)]。
+    """
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        valid = [i for i, (_, _, answers) in enumerate(chunk) if not isinstance(answers, str)]
+        scored = {}
+        if valid:
+            scores, roles = score_batch([chunk[i][2] for i in valid])
+            scored = dict(zip(valid, zip(scores.tolist(), roles.tolist())))
+        results = []
+        for i, (line_no, row_id, answers) in enumerate(chunk):
+            if i in scored:
+                row_scores, role = scored[i]
+                results.append((line_no, row_id, row_scores, ROLE_KEYS[role], None))
+            else:
+                results.append((line_no, row_id, None, None, answers))
+        yield results
+
+
+def _score_command(args):
+    """score 子命令：读取 CSV/JSONL 答卷，逐行输出 id、行号、各角色得分与诊断结果；无效行输出错误信息"""
+    fmt = args.format or ("jsonl" if args.input.endswith((".jsonl", ".ndjson")) else "csv")
+    src = sys.stdin if args.input == "-" else open(args.input, "r", encoding="utf-8", newline="")
+    dst = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8", newline="")
+    errors = 0
+    try:
+        rows = _read_jsonl_rows(src) if fmt == "jsonl" else _read_csv_rows(src)
+        writer = csv.writer(dst)
+        writer.writerow(('id', 'line') + ROLE_KEYS + ('result', 'error'))
+        for results in iter_scored_chunks(rows, args.chunk_size):
+            for line_no, row_id, row_scores, role, error in results:
+                if error is None:
+                    writer.writerow([row_id, line_no] + row_scores + [role, ""])
+                else:
+                    errors += 1
+                    writer.writerow([row_id, line_no] + [""] * len(ROLE_KEYS) + ["", error])
+    finally:
+        if src is not sys.stdin:
+            src.close()
+        if dst is not sys.stdout:
+            dst.close()
+    if errors:
+        print(f"{errors} 行答卷无效（见输出的 error 列）", file=sys.stderr)
+        sys.exit(1)
+
+
+def iter_answer_space(chunk_size=250000, pack=None):
+    """按块枚举全部答卷（选项序号的混合进制计数），逐块产出 (N, 题数) 的选项序号矩阵"""
+    pack = pack or DEFAULT_PACK
+    radix = np.concatenate(([1], np.cumprod(pack.option_counts)[:-1]))
+    total = int(np.prod(pack.option_counts, dtype=np.int64))
+    for start in range(0, total, chunk_size):
+        index = np.arange(start, min(start + chunk_size, total), dtype=np.int64)
+        yield (index[:, None] // radix) % pack.option_counts
+
+
+def _bench_ties_command(args):
+    """bench-ties 子命令：全部答卷上的平局频率，以及各同分处理策略的耗时和结果分布"""
+    pack = DEFAULT_PACK
+    n_roles = len(ROLE_KEYS)
+    questions = np.arange(pack.question_count)
+    sheets = 0
+    tie_sizes = np.zeros(n_roles + 1, dtype=np.int64)
+    elapsed = dict.fromkeys(TIE_BREAK_POLICIES, 0.0)
+    unresolved = dict.fromkeys(TIE_BREAK_POLICIES, 0)
+    winners = {policy: np.zeros(n_roles, dtype=np.int64) for policy in TIE_BREAK_POLICIES}
+
+    for answers in iter_answer_space(args.chunk_size, pack):
+        totals = pack.option_table[questions, answers].sum(axis=1, dtype=np.int32)
+        scores, tags = totals[:, :n_roles], totals[:, n_roles:]
+        tied = scores == scores.max(axis=1, keepdims=True)
+        n_tied = tied.sum(axis=1)
+        sheets += len(answers)
+        tie_sizes += np.bincount(n_tied, minlength=n_roles + 1)
+        is_tie = n_tied > 1
+
+        for policy in TIE_BREAK_POLICIES:
+            start = time.perf_counter()
+            primary, _ = break_ties(scores, tags, answers, policy, pack)
+            elapsed[policy] += time.perf_counter() - start
+            winners[policy] += np.bincount(primary[is_tie], minlength=n_roles)
+            keys = tie_keys(policy, scores, tags, answers, pack)
+            if keys is None:
+                unresolved[policy] += int(is_tie.sum())
+            else:
+                masked = np.where(tied, keys, -1)
+                still_tied = (masked == masked.max(axis=1, keepdims=True)).sum(axis=1) > 1
+                unresolved[policy] += int((still_tied & is_tie).sum())
+
+    ties = int(tie_sizes[2:].sum())
+    print(f"答卷组合: {sheets}  同分: {ties} ({ties / sheets:.2%})")
+    for size in range(2, n_roles + 1):
+        if tie_sizes[size]:
+            print(f"  {size} 个角色并列: {int(tie_sizes[size]):>9} ({tie_sizes[size] / sheets:6.2%})")
+    print(f"{'policy':<9}{'ns/sheet':>10}{'unresolved':>12}  " + " ".join(f"{role[:7]:>7}" for role in ROLE_KEYS))
+    for policy in TIE_BREAK_POLICIES:
+        shares = winners[policy] / max(ties, 1)
+        print(
+            f"{policy:<9}{elapsed[policy] / sheets * 1e9:>10.1f}{unresolved[policy] / max(ties, 1):>12.2%}  "
+            + " ".join(f"{share:>7.1%}" for share in shares)
+        )
+
+
+def adaptive_savings(policy=None, pack=None):
+    """在全部答卷上统计自适应模式省下的题数（按题目前缀动态规划，不逐张枚举答卷）
+
+    第 k 题提交后结果已确定的前缀，后面 (题数 - k) 题都省掉，共有 剩余各题选项数之积 张答卷以它开头；
+    已确定的前缀不再展开。「次へ」之后才检查，所以 k = 1..题数-1。
+    返回 (平均省下的题数, 各 k 上提前结束的答卷数, 答卷总数)。
+    """
+    pack = pack or DEFAULT_PACK
+    n_questions = pack.question_count
+    counts = np.asarray(pack.option_counts, dtype=np.int64)
+    # completions[k] = 第 k 题起剩余各题选项数之积
+    completions = np.append(np.cumprod(counts[::-1])[::-1], 1)
+    stopped = np.zeros(n_questions, dtype=np.int64)
+    scores = np.zeros((1, len(ROLE_KEYS)), dtype=np.int32)
+    for k in range(1, n_questions):
+        weights = pack.weights[k - 1, :counts[k - 1]].astype(np.int32)
+        scores = (scores[:, None, :] + weights[None, :, :]).reshape(-1, len(ROLE_KEYS))
+        locked = locked_leaders(scores, k, policy, pack) >= 0
+        stopped[k] = int(locked.sum()) * completions[k]
+        scores = scores[~locked]
+    total = int(completions[0])
+    saved = sum(int(stopped[k]) * (n_questions - k) for k in range(1, n_questions))
+    return saved / total, stopped, total
+
+
+def _adaptive_report_command(args):
+    """adaptive-report 子命令：自适应模式在全部答卷上平均省下的题数"""
+    pack = DEFAULT_PACK
+    n_questions = pack.question_count
+    start = time.perf_counter()
+    mean_saved, stopped, total = adaptive_savings(args.policy, pack)
+    elapsed = time.perf_counter() - start
+    early = int(stopped.sum())
+    print(f"答卷组合: {total}  策略: {args.policy or TIE_BREAK}  ({elapsed:.2f}s)")
+    print(f"提前结束: {early} ({early / total:.2%})  平均省下: {mean_saved:.3f} 题 / {n_questions} 题")
+    for k in range(1, n_questions):
+        if stopped[k]:
+            print(f"  答完第 {k:>2} 题结束: {int(stopped[k]):>9} ({stopped[k] / total:6.2%})")
+
+
+def _build_table_command(args):
+    """build-table 子命令：构建结果表并打印角色分布"""
+    keys, counts, roles = build_result_table(args.output)
+    total = int(counts.sum())
+    print(f"可达得分向量: {len(keys)} / 答卷组合: {total} → {args.output}")
+    for role, (answers, vectors) in role_distribution(counts, roles).items():
+        print(f"{role:<12} {answers:>9} ({answers / total:6.2%})  向量数 {vectors}")
+
+
+def main(argv=None):
+    """命令行入口"""
+    parser = argparse.ArgumentParser(prog="python -m kpop_scoring", description="诊断评分工具")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    score = commands.add_parser("score", help="批量重算历史答卷的诊断结果")
+    score.add_argument("input", help="答卷文件（.csv 或 .jsonl），'-' 表示标准输入")
+    score.add_argument("-o", "--output", default="-", help="输出 CSV 文件，默认标准输出")
+    score.add_argument("--format", choices=("csv", "jsonl"), help="输入格式，默认按扩展名判断")
+    score.add_argument("--chunk-size", type=int, default=10000, help="每块处理的答卷数")
+    score.set_defaults(handler=_score_command)
+
+    table = commands.add_parser("build-table", help="枚举全部可达得分向量并保存结果表")
+    table.add_argument("-o", "--output", default=RESULT_TABLE_PATH, help="结果表路径")
+    table.set_defaults(handler=_build_table_command)
+
+    ties = commands.add_parser("bench-ties", help="全部答卷上的平局频率与同分处理耗时")
+    ties.add_argument("--chunk-size", type=int, default=250000, help="每块枚举的答卷数")
+    ties.set_defaults(handler=_bench_ties_command)
+
+    adaptive = commands.add_parser("adaptive-report", help="自适应模式在全部答卷上平均省下的题数")
+    adaptive.add_argument("--policy", choices=TIE_BREAK_POLICIES, help="同分处理策略，默认 KPOP_TIE_BREAK")
+    adaptive.set_defaults(handler=_adaptive_report_command)
+
+    args = parser.parse_args(argv)
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
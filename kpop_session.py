@@ -0,0 +1,212 @@
+"""紧凑的会话记录 - 每个会话只保存选项序号（每题1字节）、页面游标、内容版本、语言和开始时间
+
+得分、答案文本和诊断结果都按需计算，不常驻内存。
+内容版本在开始答题时确定，之后内容包热更新也不影响进行中的会话。
+内存对比（旧版 session_state 字段 vs SessionRecord）：
+
+    python -m kpop_session bench --sessions 20000
+"""
+import argparse
+import random
+import time
+import tracemalloc
+
+import kpop_content
+import kpop_scoring
+
+# 页面游标：-1 = 欢迎页，0..题数-1 = 第N题，题数 = 结果页
+WELCOME = -1
+
+
+def option_label(question_idx, option_idx, pack=None, locale=None):
+    """选项的展示文本"""
+    return (pack or kpop_content.DEFAULT_PACK).text(locale).option_labels[question_idx][option_idx]
+
+
+class SessionRecord:
+    """单个会话的全部诊断状态"""
+
+    __slots__ = ("answers", "cursor", "pack", "locale", "started_at")
+
+    def __init__(self, answers=None, cursor=WELCOME, version=None, locale=None, started_at=None):
+        self.started_at = started_at
+        # 直接持有内容包（只是一个引用）：会话进行中内容包热更新多少次，这个版本都不会被释放
+        self.pack = kpop_content.get_pack(version) if version else kpop_content.active_pack()
+        self.locale = locale or self.pack.locale
+        self.answers = kpop_scoring.new_answer_store(self.pack) if answers is None else bytearray(answers)
+        self.cursor = cursor
+
+    @property
+    def version(self):
+        """本会话使用的内容版本"""
+        return self.pack.version
+
+    @property
+    def text(self):
+        """本会话语言的文字（kpop_content.LocaleText）"""
+        return self.pack.text(self.locale)
+
+    # 页面状态
+    @property
+    def show_welcome(self):
+        return self.cursor == WELCOME
+
+    @property
+    def show_result(self):
+        return self.cursor >= len(self.answers)
+
+    @property
+    def current_question(self):
+        return min(max(self.cursor, 0), len(self.answers) - 1)
+
+    @property
+    def page(self):
+        """页面标签：welcome / question_N / result"""
+        if self.show_welcome:
+            return "welcome"
+        if self.show_result:
+            return "result"
+        return f"question_{self.cursor + 1}"
+
+    def start(self):
+        """开始答题：使用此刻生效的内容版本，记下开始时间（Unix 秒）"""
+        pack = kpop_content.active_pack()
+        if pack is not self.pack:
+            self.pack = pack
+            self.answers = kpop_scoring.new_answer_store(pack)
+        self.cursor = 0
+        self.started_at = time.time()
+
+    def advance(self):
+        self.cursor = min(self.cursor + 1, len(self.answers))
+
+    def back(self):
+        self.cursor = max(self.cursor - 1, 0)
+
+    def finish_if_decided(self):
+        """自适应模式：已答的题已经决定了结果角色时，跳过剩下的题直接到结果页；返回是否跳过
+
+        跳过的题记为未作答（包括返回上一题前答过的后续题目），结果页按已答的题计算，角色不变。
+        """
+        if self.show_welcome or self.show_result or self.cursor == 0:
+            return False
+        if kpop_scoring.locked_role(self.answers, self.cursor, pack=self.pack) is None:
+            return False
+        self.answers[self.cursor:] = bytes([kpop_scoring.UNANSWERED]) * (len(self.answers) - self.cursor)
+        self.cursor = len(self.answers)
+        return True
+
+    # 答题记录
+    def answer(self, question_idx, option_idx):
+        """记录某题的选择（覆盖之前的选择）"""
+        self.answers[question_idx] = option_idx
+
+    @property
+    def answered(self):
+        """已作答的题数；自适应模式提前结束时小于题数"""
+        return len(self.answers) - self.answers.count(kpop_scoring.UNANSWERED)
+
+    @property
+    def complete(self):
+        """是否每题都作答了（提前结束的得分只覆盖部分题目，不能和完整答卷比较）"""
+        return self.answered == len(self.answers)
+
+    def chosen(self, question_idx):
+        """某题已选的选项序号，未作答返回 None"""
+        option_idx = self.answers[question_idx]
+        return None if option_idx == kpop_scoring.UNANSWERED else option_idx
+
+    # 按需计算的派生数据
+    @property
+    def scores(self):
+        """得分向量（按 kpop_scoring.ROLE_KEYS 排列）"""
+        return kpop_scoring.score_answer_store(self.answers, self.pack)
+
+    @property
+    def profile(self):
+        """(得分向量, 标签计数)：一次计算得到角色得分和按 kpop_scoring.TAG_KEYS 排列的标签计数"""
+        return kpop_scoring.score_profile(self.answers, self.pack)
+
+    @property
+    def score_dict(self):
+        return kpop_scoring.scores_to_dict(self.scores)
+
+    @property
+    def labels(self):
+        """已作答题目的选项文本"""
+        option_labels = self.text.option_labels
+        return tuple(
+            option_labels[q][option_idx]
+            for q, option_idx in enumerate(self.answers)
+            if option_idx != kpop_scoring.UNANSWERED
+        )
+
+    @property
+    def result(self):
+        """(结果角色, 并列角色或 None)，同分时按 kpop_scoring.TIE_BREAK 策略处理"""
+        return kpop_scoring.resolve_result(self.answers, pack=self.pack)
+
+    @property
+    def result_role(self):
+        return self.result[0]
+
+
+def _legacy_session(rng):
+    """旧版 session_state 里保存的字段（用于内存对比）"""
+    questions = kpop_content.QUESTIONS
+    answers = [rng.randrange(len(question['options'])) for question in questions]
+    return {
+        'show_welcome': False,
+        'current_question': len(questions) - 1,
+        'scores': kpop_scoring.scores_to_dict(kpop_scoring.score_answers(answers)),
+        # 旧版每次重跑都重新拼接文本，存进会话的是各自独立的字符串
+        'answers': [
+            f"{questions[q]['options'][option_idx]['text']} — {questions[q]['options'][option_idx]['desc']}"
+            for q, option_idx in enumerate(answers)
+        ],
+        'show_result': True,
+    }
+
+
+def _compact_session(rng):
+    questions = kpop_content.QUESTIONS
+    record = SessionRecord(cursor=len(questions))
+    for q, question in enumerate(questions):
+        record.answer(q, rng.randrange(len(question['options'])))
+    return {'record': record}
+
+
+def measure_bytes_per_session(factory, sessions, seed=0):
+    """用 tracemalloc 测量每个会话平均占用的字节数"""
+    rng = random.Random(seed)
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        states = [factory(rng) for _ in range(sessions)]
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    del states
+    return allocated / sessions
+
+
+def main(argv=None):
+    """命令行入口"""
+    parser = argparse.ArgumentParser(prog="python -m kpop_session", description="会话状态工具")
+    commands = parser.add_subparsers(dest="command", required=True)
+    bench = commands.add_parser("bench", help="对比每个会话的内存占用")
+    bench.add_argument("--sessions", type=int, default=20000, help="模拟的会话数")
+    args = parser.parse_args(argv)
+
+    if args.command == "bench":
+        legacy = measure_bytes_per_session(_legacy_session, args.sessions)
+        compact = measure_bytes_per_session(_compact_session, args.sessions)
+        print(f"sessions:        {args.sessions}")
+        print(f"legacy fields:   {legacy:8.1f} bytes/session")
+        print(f"SessionRecord:   {compact:8.1f} bytes/session")
+        print(f"saving:          {1 - compact / legacy:8.1%}")
+
+
+if __name__ == "__main__":
+    main()
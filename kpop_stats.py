@@ -0,0 +1,178 @@
+"""人群统计 - 各角色得分的直方图，用于结果页的「上位 N%」
+
+每个完成的诊断只给每个角色的一个桶加一（observe），查询时用后缀和查表，
+不需要扫描历史记录。进程启动时在后台线程里从结果日志（kpop_results）重建，
+重建期间的新结果直接计入，完成后合并。
+
+    python -m kpop_stats report            # 从结果日志重建并打印各角色的分位数
+
+统计的是本进程看到的结果：启动前日志里的全部结果 + 之后本进程完成的结果。
+自适应模式提前结束的结果只有部分题目的得分，不计入，这些会话也不显示排名。
+不导入 Streamlit。
+"""
+import argparse
+import math
+import os
+import sqlite3
+import sys
+import threading
+
+import numpy as np
+
+import kpop_content
+import kpop_results
+
+MIN_POPULATION = int(os.environ.get("KPOP_STATS_MIN_POPULATION", "30"))  # 人数太少时不显示排名
+REBUILD_CHUNK = 50_000
+
+
+def max_role_score(pack=None):
+    """各角色可能的最高分中的最大值（每题都选该角色权重最高的选项）"""
+    weights = (pack or kpop_content.DEFAULT_PACK).weights
+    return int(weights.max(axis=1).sum(axis=0).max())
+
+
+class ScoreHistogram:
+    """各角色得分的直方图：counts[角色, 得分] = 人数"""
+
+    def __init__(self, role_count=len(kpop_content.ROLE_KEYS), max_score=None):
+        width = (max_role_score() if max_score is None else max_score) + 1
+        self._counts = np.zeros((role_count, width), np.int64)
+        self._rows = np.arange(role_count)
+        self._tail = None  # 后缀和缓存：tail[角色, s] = 得分 >= s 的人数；有新数据时作废
+        self.total = 0
+        self._lock = threading.Lock()
+
+    def _fit(self, max_score):
+        # 内容包改了权重后最高分可能变大：扩宽直方图
+        width = self._counts.shape[1]
+        if max_score >= width:
+            self._counts = np.pad(self._counts, ((0, 0), (0, max_score + 1 - width)))
+
+    def add(self, scores):
+        """计入一个结果（按 kpop_scoring.ROLE_KEYS 排列的得分向量），每个角色 O(1)"""
+        scores = np.asarray(scores, np.intp)
+        with self._lock:
+            self._fit(int(scores.max()))
+            self._counts[self._rows, scores] += 1
+            self.total += 1
+            self._tail = None
+
+    def add_batch(self, score_matrix):
+        """计入一批结果，形状 (N, 角色数)"""
+        score_matrix = np.asarray(score_matrix, np.intp)
+        if not len(score_matrix):
+            return
+        with self._lock:
+            self._fit(int(score_matrix.max()))
+            width = self._counts.shape[1]
+            for role_idx in self._rows:
+                self._counts[role_idx] += np.bincount(score_matrix[:, role_idx], minlength=width)
+            self.total += len(score_matrix)
+            self._tail = None
+
+    def merge(self, other):
+        """并入另一个直方图的计数"""
+        with other._lock:
+            counts, total = other._counts.copy(), other.total
+        with self._lock:
+            self._fit(counts.shape[1] - 1)
+            self._counts[:, :counts.shape[1]] += counts
+            self.total += total
+            self._tail = None
+
+    def top_fraction(self, role_idx, score):
+        """得分 >= score 的人所占的比例（「上位 N%」）；没有数据时返回 None"""
+        with self._lock:
+            if not self.total:
+                return None
+            if self._tail is None:
+                self._tail = self._counts[:, ::-1].cumsum(axis=1)[:, ::-1]
+            if score >= self._tail.shape[1]:
+                return 0.0
+            return self._tail[role_idx, max(int(score), 0)] / self.total
+
+    def quantiles(self, role_idx, fractions):
+        """某角色的得分分位数（fractions 为 0..1）"""
+        with self._lock:
+            cumulative = self._counts[role_idx].cumsum()
+        return [int(np.searchsorted(cumulative, fraction * cumulative[-1])) for fraction in fractions]
+
+
+def load_from_log(histogram, path=kpop_results.LOG_PATH, until_id=None):
+    """把结果日志里 id <= until_id、每题都作答了的结果计入直方图；日志不存在时什么都不做"""
+    rows = []
+    try:
+        for row in kpop_results.iter_results(path, kpop_results.SCORE_COLUMNS, until_id=until_id, complete_only=True):
+            rows.append(row)
+            if len(rows) >= REBUILD_CHUNK:
+                histogram.add_batch(rows)
+                rows = []
+    except sqlite3.OperationalError:
+        return
+    histogram.add_batch(rows)
+
+
+POPULATION = ScoreHistogram()
+_rebuild_started = False
+_rebuild_lock = threading.Lock()
+
+
+def start_rebuild(path=kpop_results.LOG_PATH):
+    """后台线程从结果日志重建 POPULATION（每个进程只执行一次）
+
+    只读取此刻已经写入的结果，之后完成的结果由 observe() 计入，不会重复。
+    """
+    global _rebuild_started
+    with _rebuild_lock:
+        if _rebuild_started or not path:
+            return
+        _rebuild_started = True
+    until_id = kpop_results.last_id(path)
+
+    def rebuild():
+        snapshot = ScoreHistogram()
+        load_from_log(snapshot, path, until_id)
+        POPULATION.merge(snapshot)
+
+    if until_id:
+        threading.Thread(target=rebuild, name="kpop-stats-rebuild", daemon=True).start()
+
+
+def observe(scores):
+    """计入一个完成的诊断"""
+    POPULATION.add(scores)
+
+
+def top_percent(role_idx, score, histogram=None):
+    """「上位 N%」里的 N（1..100 的整数）；人数少于 MIN_POPULATION 时返回 None"""
+    histogram = histogram or POPULATION
+    if histogram.total < max(MIN_POPULATION, 1):
+        return None
+    fraction = histogram.top_fraction(role_idx, score)
+    return max(1, math.ceil(fraction * 100))
+
+
+def main(argv=None):
+    """命令行入口"""
+    parser = argparse.ArgumentParser(prog="python -m kpop_stats", description="人群统计工具")
+    parser.add_argument("--path", default=kpop_results.LOG_PATH or kpop_results.DEFAULT_LOG_PATH, help="结果库路径")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("report", help="从结果日志重建直方图，打印各角色的得分分位数")
+    args = parser.parse_args(argv)
+
+    if args.command == "report":
+        histogram = ScoreHistogram()
+        load_from_log(histogram, args.path)
+        if not histogram.total:
+            print(f"{args.path}: no results", file=sys.stderr)
+            return
+        fractions = (0.5, 0.75, 0.9, 0.99)
+        print(f"{args.path}: {histogram.total} results")
+        print(f"{'role':<12} " + " ".join(f"{'p' + str(round(f * 100)):>5}" for f in fractions))
+        for role_idx, role in enumerate(kpop_content.ROLE_KEYS):
+            print(f"{role:<12} " + " ".join(f"{q:>5}" for q in histogram.quantiles(role_idx, fractions)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""kpop_scoring 的穷举/随机对照检查：部分作答的答卷打分，以及自适应模式的提前结束
+
+    python -m pytest tests
+"""
+import itertools
+import random
+
+import numpy as np
+import pytest
+
+import kpop_scoring
+import kpop_session
+
+PACK = kpop_scoring.DEFAULT_PACK
+N_ROLES = len(kpop_scoring.ROLE_KEYS)
+UNANSWERED = kpop_scoring.UNANSWERED
+
+
+def reference_result(answers, policy):
+    """逐题、逐角色的直白实现：只看已作答的题 → (结果角色序号, 并列角色序号或 -1)"""
+    answered = [(q, option_idx) for q, option_idx in enumerate(answers) if option_idx != UNANSWERED]
+    rows = [PACK.option_table[q, option_idx].tolist() for q, option_idx in answered]
+    scores = [sum(row[r] for row in rows) for r in range(N_ROLES)]
+    tags = [sum(row[N_ROLES + t] for row in rows) for t in range(len(kpop_scoring.TAG_KEYS))]
+    tied = [r for r in range(N_ROLES) if scores[r] == max(scores)]
+
+    candidates = tied
+    if policy == "tags":
+        affinity = kpop_scoring.role_tag_affinity(PACK).tolist()
+        keys = {r: sum(count * weight for count, weight in zip(tags, affinity[r])) for r in tied}
+        candidates = [r for r in tied if keys[r] == max(keys.values())]
+    elif policy == "recency":
+        # 从最后一个已作答的题往前，逐题只留下这题得分最高的角色
+        for row in reversed(rows):
+            best = max(row[r] for r in candidates)
+            candidates = [r for r in candidates if row[r] == best]
+            if len(candidates) == 1:
+                break
+    primary = candidates[0]
+    others = [r for r in tied if r != primary]
+    return primary, (others[0] if policy == "dual" and others else -1)
+
+
+def random_sheet(rng, skip_rate):
+    return [
+        UNANSWERED if rng.random() < skip_rate else rng.randrange(count)
+        for count in PACK.option_counts.tolist()
+    ]
+
+
+@pytest.fixture(params=kpop_scoring.TIE_BREAK_POLICIES)
+def policy(request, monkeypatch):
+    """把默认策略（KPOP_TIE_BREAK）换成被测策略"""
+    monkeypatch.setattr(kpop_scoring, "TIE_BREAK", request.param)
+    return request.param
+
+
+def test_recency_ignores_unanswered_questions():
+    # 前三题之后都没作答：concept 与 lyric 同分，最近一个作答的第3题上 lyric 得分更高
+    store = bytes([0, 0, 3] + [UNANSWERED] * 7)
+    assert kpop_scoring.score_answer_store(store).tolist() == [4, 2, 4, 0, 0, 2]
+    assert kpop_scoring.resolve_result(store, "recency") == ("lyric", None)
+
+
+def test_partial_sheets_match_reference(policy):
+    rng = random.Random(0)
+    sheets = [random_sheet(rng, skip_rate) for skip_rate in (0.0, 0.3, 0.7) for _ in range(400)]
+    scores, roles = kpop_scoring.score_batch(sheets)
+    for answers, row_scores, role in zip(sheets, scores.tolist(), roles.tolist()):
+        primary, co_role = reference_result(answers, policy)
+        record = kpop_session.SessionRecord(answers=answers, cursor=len(answers))
+        assert row_scores == record.scores.tolist()
+        assert role == primary, answers
+        assert record.result == (
+            kpop_scoring.ROLE_KEYS[primary], kpop_scoring.ROLE_KEYS[co_role] if co_role >= 0 else None
+        ), answers
+
+
+def _features(sheets):
+    """(N, 题数) 答卷（可含 UNANSWERED）→ (得分 + 标签计数, 近因键)；两者都是各题贡献之和"""
+    answered = sheets != UNANSWERED
+    rows = PACK.option_table[np.arange(PACK.question_count), np.where(answered, sheets, 0)]
+    totals = (rows.astype(np.int64) * answered[..., None]).sum(axis=1)
+    return totals, kpop_scoring._recency_keys(sheets, PACK)
+
+
+def _primary(totals, recency, policy):
+    scores, tags = totals[..., :N_ROLES], totals[..., N_ROLES:]
+    keys = recency if policy == "recency" else kpop_scoring.tie_keys(policy, scores, tags, pack=PACK)
+    primary, _ = kpop_scoring.break_ties(scores, policy="first", pack=PACK)
+    if keys is not None:
+        tied = scores == scores.max(axis=-1, keepdims=True)
+        primary = np.argmax(np.where(tied, keys, -1), axis=-1)
+    return primary
+
+
+def test_locked_prefix_holds_for_every_completion(policy):
+    """答完前 k 题就判定为确定的每个前缀，后面各题的每一种选法最终都得到同一个结果角色
+
+    按题目前缀逐层展开（与 adaptive_savings 相同），已确定的前缀不再展开；
+    得分、标签计数和近因键都是各题贡献之和，所以「前缀 + 每种后缀」就是全部完整答卷。
+    """
+    n_questions = PACK.question_count
+    counts = PACK.option_counts.tolist()
+    # 每层只保留还没确定的前缀的特征（前缀本身不需要）：新一题的贡献直接加上去
+    prefix_totals, prefix_recency = _features(np.full((1, n_questions), UNANSWERED, dtype=np.intp))
+    locked_sheets = 0
+    for k in range(1, n_questions):
+        step = np.full((counts[k - 1], n_questions), UNANSWERED, dtype=np.intp)
+        step[:, k - 1] = np.arange(counts[k - 1])
+        step_totals, step_recency = _features(step)
+        prefix_totals = (prefix_totals[:, None] + step_totals).reshape(-1, prefix_totals.shape[-1])
+        prefix_recency = (prefix_recency[:, None] + step_recency).reshape(-1, N_ROLES)
+        leaders = kpop_scoring.locked_leaders(prefix_totals[:, :N_ROLES], k, policy, PACK)
+        locked = leaders >= 0
+        if locked.any():
+            suffixes = np.full((int(np.prod(counts[k:])), n_questions), UNANSWERED, dtype=np.intp)
+            suffixes[:, k:] = list(itertools.product(*(range(count) for count in counts[k:])))
+            suffix_totals, suffix_recency = _features(suffixes)
+            locked_totals, locked_recency, locked_roles = prefix_totals[locked], prefix_recency[locked], leaders[locked]
+            chunk = max(1, 200_000 // len(suffixes))
+            for start in range(0, len(locked_roles), chunk):
+                window = slice(start, start + chunk)
+                final = _primary(
+                    locked_totals[window, None] + suffix_totals,
+                    locked_recency[window, None] + suffix_recency,
+                    policy,
+                )
+                assert (final == locked_roles[window, None]).all(), k
+            locked_sheets += int(locked.sum()) * len(suffixes)
+        prefix_totals, prefix_recency = prefix_totals[~locked], prefix_recency[~locked]
+    # 与 adaptive-report 统计的提前结束答卷数一致
+    assert locked_sheets == int(kpop_scoring.adaptive_savings(policy, PACK)[1].sum())
+
+
+def test_adaptive_session_shows_the_full_result(policy):
+    rng = random.Random(1)
+    for _ in range(300):
+        answers = random_sheet(rng, 0.0)
+        record = kpop_session.SessionRecord()
+        record.start()
+        while not record.show_result:
+            record.answer(record.current_question, answers[record.current_question])
+            record.advance()
+            record.finish_if_decided()
+        assert record.answered <= len(answers)
+        assert record.result_role == kpop_scoring.ROLE_KEYS[reference_result(answers, policy)[0]], answers